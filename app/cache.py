@@ -0,0 +1,222 @@
+"""
+Caching module for the Channel Adapter API
+Content-addressed on-disk cache for synthesized audio and an in-memory
+cache for forwarding results
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AudioCache:
+    """On-disk audio cache keyed by a hash of the synthesis parameters"""
+    
+    def __init__(self, cache_dir: str, max_size_bytes: int, extension: str = ".mp3"):
+        """
+        Initialize the audio cache
+        
+        Args:
+            cache_dir: Directory where cached audio files are stored
+            max_size_bytes: Total size above which least recently used files are evicted
+            extension: File extension of cached audio files
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.extension = extension
+        self._in_flight: Dict[str, "InFlightAudio"] = {}
+    
+    @staticmethod
+    def make_key(text: str, language: str, slow: bool) -> str:
+        """Build the cache key for a (text, language, slow) synthesis request"""
+        return hashlib.blake2b(f"{language}|{slow}|{text}".encode("utf-8"), digest_size=16).hexdigest()
+    
+    def path_for(self, key: str) -> str:
+        """Path of the cached audio file for a key"""
+        return os.path.join(self.cache_dir, f"{key}{self.extension}")
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up cached audio
+        
+        Args:
+            key: Cache key from make_key
+        
+        Returns:
+            Path of the cached file, or None on a miss
+        """
+        path = self.path_for(key)
+        try:
+            # Refresh the access time explicitly; filesystems mounted with
+            # noatime/relatime would otherwise break LRU ordering
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+    
+    def store(self, key: str, data: bytes) -> str:
+        """
+        Store audio in the cache
+        
+        The file is written under a temporary name and renamed into place so
+        concurrent readers never see a partially written file.
+        
+        Args:
+            key: Cache key from make_key
+            data: Audio bytes to store
+        
+        Returns:
+            Path of the cached file
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(key)
+        # Random name opened exclusively; cheaper than tempfile.mkstemp's name generation
+        temp_path = os.path.join(self.cache_dir, f"{os.urandom(8).hex()}.tmp")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        
+        self.evict()
+        return path
+    
+    def evict(self):
+        """Remove least recently used files until the cache fits its size cap"""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith(self.extension)
+            ]
+        except FileNotFoundError:
+            return
+        
+        stats = [(entry.path, entry.stat()) for entry in entries]
+        total_size = sum(stat.st_size for _, stat in stats)
+        if total_size <= self.max_size_bytes:
+            return
+        
+        for path, stat in sorted(stats, key=lambda item: item[1].st_atime):
+            try:
+                os.unlink(path)
+                total_size -= stat.st_size
+            except FileNotFoundError:
+                continue
+            if total_size <= self.max_size_bytes:
+                break
+        logger.info("Evicted audio cache entries, cache size now %d bytes", total_size)
+    
+    def in_flight(self, key: str) -> Optional["InFlightAudio"]:
+        """The synthesis currently producing the audio of a key, if any"""
+        return self._in_flight.get(key)
+    
+    def start_in_flight(self, key: str) -> "InFlightAudio":
+        """Register a synthesis for a key so identical requests can join it"""
+        in_flight = InFlightAudio()
+        self._in_flight[key] = in_flight
+        return in_flight
+    
+    def end_in_flight(self, key: str):
+        """Forget the synthesis of a key once it has finished"""
+        self._in_flight.pop(key, None)
+
+
+class InFlightAudio:
+    """
+    Audio being synthesized, shared by every request for the same key
+    
+    Parts are kept as they arrive, so a request joining late still receives
+    the audio from its start.
+    """
+    
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.audio_path: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self._changed = asyncio.Event()
+    
+    def _notify(self):
+        """Wake everything waiting for a change and arm a fresh event"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    def publish(self, part: bytes):
+        """Add a synthesized part"""
+        self.parts.append(part)
+        self._notify()
+    
+    def finish(self, audio_path: Optional[str] = None, error: Optional[BaseException] = None):
+        """Mark the synthesis complete, with the cached file path or the error it failed with"""
+        self.audio_path = audio_path
+        self.error = error
+        self.done = True
+        self._notify()
+    
+    async def iterate(self) -> AsyncIterator[bytes]:
+        """Yield every part, waiting for new ones until the synthesis is complete"""
+        index = 0
+        while True:
+            if index < len(self.parts):
+                yield self.parts[index]
+                index += 1
+            elif self.done:
+                break
+            else:
+                await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+    
+    async def result(self) -> bytes:
+        """Wait for the synthesis to complete and return the whole audio"""
+        while not self.done:
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+        return b"".join(self.parts)
+
+
+class ResponseCache:
+    """In-memory LRU cache of forwarding results with a time-to-live"""
+    
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 30.0):
+        """
+        Initialize the response cache
+        
+        Args:
+            max_entries: Maximum number of cached results
+            ttl_seconds: Seconds a cached result stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return result
+    
+    def put(self, key: Tuple[Hashable, ...], result: Dict[str, Any]):
+        """Cache a result, evicting the least recently used entry when full"""
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
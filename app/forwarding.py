@@ -4,8 +4,9 @@ Handles all REST API forwarding logic
 """
 import logging
 from typing import Optional, Dict, Any, List
-from fastapi import UploadFile
+from fastapi import HTTPException, UploadFile
 
+from app.cache import ResponseCache
 from app.utils import (
     parse_custom_headers,
     create_forwarding_response,
@@ -13,6 +14,8 @@ from app.utils import (
     extract_successful_results,
     prepare_batch_results,
     create_tts_forwarding_payload,
+    create_transcription_result_format,
+    create_text_input_result_format,
     handle_api_error
 )
 
@@ -25,6 +28,9 @@ class ForwardingService:
         self.voice_to_text_converter = voice_to_text_converter
         self.text_to_voice_converter = text_to_voice_converter
         self.rest_api_client = rest_api_client
+        # Short-lived cache of forward results for client retries carrying an
+        # idempotency key; the agent is stateful, so results are never reused by content
+        self.idempotency_cache = ResponseCache()
     
     async def forward_voice_to_text(
         self,
@@ -62,6 +68,8 @@ class ForwardingService:
                 "transcription"
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise handle_api_error("voice-to-text forwarding", e)
     
@@ -76,7 +84,9 @@ class ForwardingService:
         """Convert multiple audio files to text and forward results to external API."""
         try:
             # Convert all audio files to text
-            batch_transcription_result = await self.voice_to_text_converter.transcribe_batch(files, language)
+            batch_transcription_result = await self.voice_to_text_converter.transcribe_batch(
+                files, language, concurrent_limit
+            )
             
             # Prepare individual transcription results for forwarding
             transcription_results = prepare_batch_results(batch_transcription_result)
@@ -97,6 +107,8 @@ class ForwardingService:
                 "transcription"
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise handle_api_error("batch voice-to-text forwarding", e)
     
@@ -113,7 +125,6 @@ class ForwardingService:
             headers = parse_custom_headers(custom_headers)
             
             # Create transcription result format
-            from app.utils import create_transcription_result_format
             transcription_result = create_transcription_result_format(
                 transcription_text, language, source
             )
@@ -132,6 +143,8 @@ class ForwardingService:
                 "transcription"
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise handle_api_error("transcription forwarding", e)
     
@@ -145,16 +158,24 @@ class ForwardingService:
         custom_headers: Optional[str] = None,
         session_id: Optional[str] = None,
         user_id: Optional[str] = None,
-        channel: Optional[str] = None
+        channel: Optional[str] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Receive text input and forward to external API."""
+        """
+        Receive text input and forward to external API.
+        
+        Sending the same message twice is a new conversational turn, so it is
+        forwarded every time. Only a retry of one request, identified by a
+        client-supplied idempotency key, gets the earlier result back. Keys are
+        scoped to the session, user and target, and a key reused for a
+        different request is rejected with 422.
+        """
         try:
             headers = parse_custom_headers(custom_headers)
             
             # Process the text input first
-            logger.info(f"Received text from {source}: {text[:100]}...")
+            logger.info("Received text from %s: %.100s...", source, text)
             
-            from app.utils import create_text_input_result_format
             text_input_result = create_text_input_result_format(text, source, timestamp)
             
             # Add session tracking information to the text input result
@@ -165,6 +186,24 @@ class ForwardingService:
                     "channel": channel
                 }
             
+            cache_key = None
+            if idempotency_key:
+                cache_key = (idempotency_key, session_id, user_id, target_url)
+                request_body = (text, source, include_metadata, channel, custom_headers)
+                cached_entry = self.idempotency_cache.get(cache_key)
+                if cached_entry is not None:
+                    if cached_entry["request_body"] != request_body:
+                        raise HTTPException(
+                            status_code=422,
+                            detail="Idempotency-Key was already used for a different request"
+                        )
+                    return create_forwarding_response(
+                        text_input_result,
+                        cached_entry["forward_result"],
+                        "text_input",
+                        cached=True
+                    )
+            
             # Forward to external API
             forward_result = await self.rest_api_client.forward_text_input_result(
                 text,
@@ -177,12 +216,20 @@ class ForwardingService:
                 headers
             )
             
+            if cache_key is not None and forward_result.get("success", False):
+                self.idempotency_cache.put(
+                    cache_key,
+                    {"request_body": request_body, "forward_result": forward_result}
+                )
+            
             return create_forwarding_response(
                 text_input_result,
                 forward_result,
                 "text_input"
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise handle_api_error("text input forwarding", e)
     
@@ -203,11 +250,11 @@ class ForwardingService:
             # Convert text to voice (get info, not audio file)
             tts_result = await self.text_to_voice_converter.convert_to_speech_info(text, language, slow)
             
-            # If we need audio data, also generate the actual audio file
+            # If we need audio data, point at the audio file synthesized above
             if include_audio_data:
-                audio_response = await self.text_to_voice_converter.convert_to_speech(text, language, slow)
-                if hasattr(audio_response, 'path'):
-                    tts_result["file_path"] = audio_response.path
+                cached_speech = self.text_to_voice_converter.get_cached_speech(text, language, slow)
+                if cached_speech is not None:
+                    tts_result["file_path"] = cached_speech[1]
             
             # Forward to external API
             forward_result = await self.rest_api_client.forward_text_to_voice_result(
@@ -224,6 +271,8 @@ class ForwardingService:
                 "text_to_voice"
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise handle_api_error("text-to-voice forwarding", e)
     
@@ -243,20 +292,22 @@ class ForwardingService:
             headers = parse_custom_headers(custom_headers)
             
             # Convert all texts to speech (batch processing)
-            batch_tts_result = await self.text_to_voice_converter.convert_batch_to_speech(texts, language, slow)
+            batch_tts_result = await self.text_to_voice_converter.convert_batch_to_speech(
+                texts, language, slow, concurrent_limit
+            )
             
             # Prepare individual TTS results for forwarding
             tts_results = prepare_batch_results(batch_tts_result)
             successful_conversions = extract_successful_results(tts_results)
             
             if successful_conversions:
-                # Create forwarding payloads
-                forward_payloads = [
+                # Build forwarding payloads lazily as each request is sent
+                forward_payloads = (
                     create_tts_forwarding_payload(
                         tts_result, language, slow, include_metadata, tts_result.get("index", 0)
                     )
                     for tts_result in successful_conversions
-                ]
+                )
                 
                 forward_results = await self.rest_api_client.send_batch_transcriptions(
                     target_url,
@@ -273,15 +324,7 @@ class ForwardingService:
                 "text_to_voice"
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise handle_api_error("batch text-to-voice forwarding", e)
-
-# Global instance to be used in main.py
-forwarding_service = None
-
-def get_forwarding_service(voice_to_text_converter, text_to_voice_converter, rest_api_client):
-    """Get or create the global forwarding service instance"""
-    global forwarding_service
-    if forwarding_service is None:
-        forwarding_service = ForwardingService(voice_to_text_converter, text_to_voice_converter, rest_api_client)
-    return forwarding_service
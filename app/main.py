@@ -2,26 +2,85 @@
 Main FastAPI application for Voice-Text conversion service
 Combines voice-to-text and text-to-voice functionality
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, Header, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional, List
+import asyncio
 import logging
+import os
+import queue
+import orjson
 
 # Import our custom modules
 from app.voice_to_text import voice_to_text_converter
 from app.text_to_voice import text_to_voice_converter
 from app.rest_api_client import rest_api_client
-from app.forwarding import get_forwarding_service
-from app.utils import create_text_input_result_format, handle_api_error
+from app.forwarding import ForwardingService
+from app.utils import (
+    content_disposition,
+    create_text_input_result_format,
+    encode_header_text,
+    env_flag,
+    env_list,
+    etag_matches,
+    extract_agent_response,
+    handle_api_error
+)
 from app.auth import verify_token
+from app.schemas import ForwardingResponse, BatchForwardingResponse, TextInputRequest, TextToVoiceBatchRequest
+
+# Configure logging: handlers on the request path only enqueue records,
+# a listener thread formats and writes them
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_listener = QueueListener(log_queue, log_handler, respect_handler_level=True)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+root_logger = logging.getLogger()
+if not root_logger.handlers:
+    root_logger.addHandler(QueueHandler(log_queue))
+root_logger.setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Hardcoded target URL for forwarding
-TARGET_URL = "http://host.docker.internal:8003/chat"
+# Target URL for forwarding
+TARGET_URL = os.getenv("TARGET_URL", "http://host.docker.internal:8003/chat")
+
+# Whether TARGET_URL accepts batched {"items": [...]} payloads
+TARGET_SUPPORTS_BATCH = env_flag("TARGET_SUPPORTS_BATCH")
+
+# Whether TARGET_URL accepts text-to-voice audio as multipart/form-data
+# instead of base64 inside the JSON payload
+TARGET_SUPPORTS_MULTIPART_AUDIO = env_flag("TARGET_SUPPORTS_MULTIPART_AUDIO")
+
+# Phrases synthesized into the TTS cache in the background on startup,
+# separated by "|" since phrases may contain commas
+TTS_PRECACHE_PHRASES = env_list("TTS_PRECACHE_PHRASES")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared services on startup and release them on shutdown"""
+    log_listener.start()
+    app.state.forwarding = ForwardingService(voice_to_text_converter, text_to_voice_converter, rest_api_client)
+    if TARGET_SUPPORTS_BATCH:
+        rest_api_client.register_batch_endpoint(TARGET_URL)
+    if TARGET_SUPPORTS_MULTIPART_AUDIO:
+        rest_api_client.register_multipart_audio_endpoint(TARGET_URL)
+    await rest_api_client.connect()
+    await rest_api_client.warmup(TARGET_URL)
+    precache_task = None
+    if TTS_PRECACHE_PHRASES:
+        precache_task = asyncio.create_task(text_to_voice_converter.warm_cache(TTS_PRECACHE_PHRASES))
+    yield
+    logger.info("Shutting down application...")
+    if precache_task is not None:
+        precache_task.cancel()
+    await rest_api_client.close()
+    logger.info("REST API client closed successfully")
+    await text_to_voice_converter.close()
+    log_listener.stop()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -29,7 +88,9 @@ app = FastAPI(
     description="A comprehensive FastAPI service for voice-to-text and text-to-voice conversions",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -41,37 +102,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize forwarding service
-forwarding_service = get_forwarding_service(voice_to_text_converter, text_to_voice_converter, rest_api_client)
+# Root and health endpoints, serialized once since their content never changes
+ROOT_INFO = orjson.dumps({
+    "message": "channel adapter",
+    "version": "2.0.0",
+    "status": "running",
+    "features": [
+        "voice-to-text conversion",
+        "text-to-voice synthesis",
+        "text input processing",
+        "text chat with agent response",
+        "batch processing",
+        "multiple audio formats",
+        "configurable voice parameters",
+        "REST API forwarding",
+        "external service integration",
+        "text input forwarding",
+        "text-to-voice forwarding",
+        "audio data forwarding",
+        "session tracking support",
+        "voice-to-voice workflow"
+    ]
+})
+HEALTH_STATUS = orjson.dumps({"status": "healthy", "service": "channel-adapter"})
 
-# Root and health endpoints
 @app.get("/")
 async def root():
-    return {
-        "message": "channel adapter",
-        "version": "2.0.0",
-        "status": "running",
-        "features": [
-            "voice-to-text conversion",
-            "text-to-voice synthesis",
-            "text input processing",
-            "text chat with agent response",
-            "batch processing",
-            "multiple audio formats",
-            "configurable voice parameters",
-            "REST API forwarding",
-            "external service integration",
-            "text input forwarding",
-            "text-to-voice forwarding",
-            "audio data forwarding",
-            "session tracking support",
-            "voice-to-voice workflow"
-        ]
-    }
+    return Response(content=ROOT_INFO, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "channel-adapter"}
+    return Response(content=HEALTH_STATUS, media_type="application/json")
 
 # Text input endpoint
 @app.post("/text-input/")
@@ -83,7 +144,7 @@ async def receive_text_from_ui(
     """Receive text input from UI or other sources."""
     try:
         # Log the received text
-        logger.info(f"Received text from {source}: {text[:100]}...")
+        logger.info("Received text from %s: %.100s...", source, text)
         
         # Use utility function to create response
         response = create_text_input_result_format(text, source or "ui", timestamp)
@@ -92,6 +153,16 @@ async def receive_text_from_ui(
     except Exception as e:
         raise handle_api_error("text input processing", e)
 
+@app.post("/text-input-json/")
+async def receive_text_json(body: TextInputRequest):
+    """Receive text input as a JSON body, avoiding form parsing for large texts."""
+    try:
+        logger.info("Received text from %s: %.100s...", body.source, body.text)
+        return create_text_input_result_format(body.text, body.source or "ui", body.timestamp)
+        
+    except Exception as e:
+        raise handle_api_error("text input processing", e)
+
 # Voice to Text endpoints
 @app.post("/voice-to-text/")
 async def convert_voice_to_text(
@@ -114,10 +185,11 @@ async def convert_voice_to_text_batch(
 async def convert_text_to_voice(
     text: str = Form(...),
     language: str = Form("en"),
-    slow: bool = Form(False)
+    slow: bool = Form(False),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Convert text to speech using Google Text-to-Speech (gTTS)."""
-    return await text_to_voice_converter.convert_to_speech(text, language, slow)
+    return await text_to_voice_converter.convert_to_speech(text, language, slow, if_none_match)
 
 @app.post("/text-to-voice/info/")
 async def convert_text_to_voice_info(
@@ -132,14 +204,32 @@ async def convert_text_to_voice_info(
 async def convert_text_to_voice_batch(
     texts: List[str] = Form(...),
     language: str = Form("en"),
-    slow: bool = Form(False)
+    slow: bool = Form(False),
+    concurrent_limit: int = Form(3)
 ):
     """Convert multiple texts to speech using Google Text-to-Speech (gTTS)."""
-    return await text_to_voice_converter.convert_batch_to_speech(texts, language, slow)
+    return await text_to_voice_converter.convert_batch_to_speech(texts, language, slow, concurrent_limit)
+
+@app.post("/text-to-voice/cache/warm/")
+async def warm_text_to_voice_cache(
+    texts: List[str] = Form(...),
+    language: str = Form("en"),
+    slow: bool = Form(False)
+):
+    """Synthesize phrases into the TTS cache so later requests for them are served instantly."""
+    return await text_to_voice_converter.warm_cache(texts, language, slow)
+
+@app.post("/text-to-voice/batch-json/")
+async def convert_text_to_voice_batch_json(body: TextToVoiceBatchRequest):
+    """Convert multiple texts sent as a JSON body to speech using Google Text-to-Speech (gTTS)."""
+    return await text_to_voice_converter.convert_batch_to_speech(
+        body.texts, body.language, body.slow, body.concurrent_limit
+    )
 
 # REST API forwarding endpoints
-@app.post("/voice-to-text-forward/")
+@app.post("/voice-to-text-forward/", response_model=ForwardingResponse)
 async def convert_voice_to_text_and_forward(
+    request: Request,
     file: UploadFile = File(...),
     language: Optional[str] = "en-US",
     include_metadata: bool = Form(True),
@@ -148,37 +238,40 @@ async def convert_voice_to_text_and_forward(
     channel: Optional[str] = Form(None)
 ):
     """Convert audio file to text and forward result to external API."""
-    return await forwarding_service.forward_voice_to_text(
+    return await request.app.state.forwarding.forward_voice_to_text(
         file, TARGET_URL, language or "en-US", include_metadata, session_id, user_id, channel
     )
 
-@app.post("/voice-to-text-batch-forward/")
+@app.post("/voice-to-text-batch-forward/", response_model=BatchForwardingResponse)
 async def convert_voice_to_text_batch_and_forward(
+    request: Request,
     files: List[UploadFile] = File(...),
     language: Optional[str] = "en-US",
     include_metadata: bool = Form(True),
     concurrent_limit: int = Form(3)
 ):
     """Convert multiple audio files to text and forward results to external API."""
-    return await forwarding_service.forward_voice_to_text_batch(
+    return await request.app.state.forwarding.forward_voice_to_text_batch(
         files, TARGET_URL, language or "en-US", include_metadata, concurrent_limit
     )
 
-@app.post("/forward-transcription/")
+@app.post("/forward-transcription/", response_model=ForwardingResponse)
 async def forward_existing_transcription(
+    request: Request,
     transcription_text: str = Form(...),
     language: Optional[str] = Form("en-US"),
     source: Optional[str] = Form("manual"),
     custom_headers: Optional[str] = Form(None)
 ):
     """Forward an existing transcription text to external API."""
-    return await forwarding_service.forward_existing_transcription(
+    return await request.app.state.forwarding.forward_existing_transcription(
         transcription_text, TARGET_URL, language or "en-US", source or "manual", custom_headers
     )
 
 # Text input forwarding endpoints
-@app.post("/text-input-forward/")
+@app.post("/text-input-forward/", response_model=ForwardingResponse)
 async def receive_text_from_ui_and_forward(
+    request: Request,
     # user=Depends(verify_token(required_groups=["agent_group"])),
     text: str = Form(...),
     source: Optional[str] = Form("ui"),
@@ -187,11 +280,13 @@ async def receive_text_from_ui_and_forward(
     custom_headers: Optional[str] = Form(None),
     session_id: Optional[str] = Form(None),
     user_id: Optional[str] = Form(None),
-    channel: Optional[str] = Form(None)
+    channel: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """Receive text input from UI and forward to external API."""
-    return await forwarding_service.forward_text_input(
-        text, TARGET_URL, source or "ui", timestamp, include_metadata, custom_headers, session_id, user_id, channel
+    return await request.app.state.forwarding.forward_text_input(
+        text, TARGET_URL, source or "ui", timestamp, include_metadata, custom_headers, session_id, user_id, channel,
+        idempotency_key
     )
 
 # Text chat endpoint - direct agent response
@@ -208,7 +303,7 @@ async def text_chat_with_agent(
     """
     try:
         # Log the received text
-        logger.info(f"Processing text chat for session {session_id}: {text[:100]}...")
+        logger.info("Processing text chat for session %s: %.100s...", session_id, text)
         
         # Create text input result format
         text_input_result = create_text_input_result_format(text, "chat", None)
@@ -222,7 +317,7 @@ async def text_chat_with_agent(
             }
         
         # Forward to external API
-        logger.info(f"Forwarding text to {TARGET_URL}")
+        logger.info("Forwarding text to %s", TARGET_URL)
         forward_result = await rest_api_client.forward_text_input_result(
             text,
             text_input_result,
@@ -236,18 +331,15 @@ async def text_chat_with_agent(
         if not forward_result.get("success", False):
             raise HTTPException(status_code=500, detail="Failed to forward text to external API")
         
-        # Extract agent response from response data
-        response_data = forward_result.get("response_data", {})
-        if 'response' not in response_data or 'agent_response' not in response_data['response']:
+        # Extract the agent response text from response data
+        agent_response = extract_agent_response(forward_result.get("response_data", {}))
+        if agent_response is None:
             raise HTTPException(status_code=500, detail="Invalid response format from external API")
         
-        # Extract the agent response text
-        agent_response = response_data["response"]["agent_response"]
-        
         if not agent_response:
             raise HTTPException(status_code=500, detail="No agent response found in external API response")
         
-        logger.info(f"Extracted agent response: {agent_response[:100]}...")
+        logger.info("Extracted agent response: %.100s...", agent_response)
         
         # Return response with session tracking
         return {
@@ -264,12 +356,13 @@ async def text_chat_with_agent(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in text chat: {str(e)}")
+        logger.error("Error in text chat: %s", e)
         raise HTTPException(status_code=500, detail=f"Text chat failed: {str(e)}")
 
 # Text-to-voice forwarding endpoints
-@app.post("/text-to-voice-forward/")
+@app.post("/text-to-voice-forward/", response_model=ForwardingResponse)
 async def convert_text_to_voice_and_forward(
+    request: Request,
     text: str = Form(...),
     language: str = Form("en"),
     slow: bool = Form(False),
@@ -278,12 +371,13 @@ async def convert_text_to_voice_and_forward(
     custom_headers: Optional[str] = Form(None)
 ):
     """Convert text to speech and forward result to external API."""
-    return await forwarding_service.forward_text_to_voice(
+    return await request.app.state.forwarding.forward_text_to_voice(
         text, TARGET_URL, language, slow, include_audio_data, include_metadata, custom_headers
     )
 
-@app.post("/text-to-voice-batch-forward/")
+@app.post("/text-to-voice-batch-forward/", response_model=BatchForwardingResponse)
 async def convert_text_to_voice_batch_and_forward(
+    request: Request,
     texts: List[str] = Form(...),
     language: str = Form("en"),
     slow: bool = Form(False),
@@ -293,7 +387,7 @@ async def convert_text_to_voice_batch_and_forward(
     custom_headers: Optional[str] = Form(None)
 ):
     """Convert multiple texts to speech and forward results to external API."""
-    return await forwarding_service.forward_text_to_voice_batch(
+    return await request.app.state.forwarding.forward_text_to_voice_batch(
         texts, TARGET_URL, language, slow, include_audio_data, include_metadata, concurrent_limit, custom_headers
     )
 
@@ -307,7 +401,8 @@ async def voice_to_voice_workflow(
     channel: Optional[str] = Form(None),
     language: Optional[str] = "en-US",
     voice_language: str = Form("en"),
-    slow: bool = Form(False)
+    slow: bool = Form(False),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Complete voice-to-voice workflow:
@@ -315,11 +410,11 @@ async def voice_to_voice_workflow(
     2. Forward text to external API with session info
     3. Get response and extract text field
     4. Convert response text to voice
-    5. Return voice file
+    5. Return the voice audio, from the TTS cache or streamed as it is synthesized
     """
     try:
         # Step 1: Convert voice to text
-        logger.info(f"Converting voice to text for session {session_id}")
+        logger.info("Converting voice to text for session %s", session_id)
         transcription_result = await voice_to_text_converter.transcribe_audio(file, language or "en-US")
         
         if not transcription_result.get("success", False):
@@ -333,8 +428,9 @@ async def voice_to_voice_workflow(
                 "channel": channel
             }
         
-        # Step 2: Forward to external API
-        logger.info(f"Forwarding transcription to {TARGET_URL}")
+        # Step 2: Forward to external API, warming up TTS in the background meanwhile
+        logger.info("Forwarding transcription to %s", TARGET_URL)
+        text_to_voice_converter.schedule_warmup()
         forward_result = await rest_api_client.forward_transcription_result(
             transcription_result,
             TARGET_URL,
@@ -344,71 +440,57 @@ async def voice_to_voice_workflow(
         if not forward_result.get("success", False):
             raise HTTPException(status_code=500, detail="Failed to forward transcription to external API")
         
-        # Step 3: Extract text from response
-        response_data = forward_result.get("response_data", {})
-        if 'response' not in response_data or 'agent_response' not in response_data['response']:
+        # Step 3: Extract the agent response text from response data
+        response_text = extract_agent_response(forward_result.get("response_data", {}))
+        if response_text is None:
             raise HTTPException(status_code=500, detail="Invalid response format from external API")
-        # Extract the agent response text
-        response_text = response_data["response"]["agent_response"]
-
-        # # Try different common field names for text response
-        # text_fields = ["response","agent_response"]
-        # for field in text_fields:
-        #     if field in response_data and response_data[field]:
-        #         response_text = str(response_data[field])
-        #         break
-        
-        # # If no text field found, try to find any string value in the response
-        # if not response_text:
-        #     for key, value in response_data.items():
-        #         if isinstance(value, str) and len(value.strip()) > 0:
-        #             response_text = value
-        #             break
         
         if not response_text:
             raise HTTPException(status_code=500, detail="No text field found in external API response")
         
-        logger.info(f"Extracted response text: {response_text[:100]}...")
+        logger.info("Extracted response text: %.100s...", response_text)
         
         # Step 4: Convert response text back to voice
         logger.info("Converting response text to voice")
-        voice_response = await text_to_voice_converter.convert_to_speech(
+        filename = f"response_{session_id or 'audio'}.mp3"
+        # Client input and agent text may hold any character, header values
+        # only latin-1
+        headers = {
+            "Content-Disposition": content_disposition(filename),
+            "X-Original-Text": encode_header_text(transcription_result.get("text", "")),
+            "X-Response-Text": encode_header_text(response_text),
+            "X-Session-ID": encode_header_text(session_id or ""),
+            "X-User-ID": encode_header_text(user_id or ""),
+            "X-Channel": encode_header_text(channel or ""),
+            "X-Workflow": "voice-to-voice-complete"
+        }
+        
+        cached_speech = text_to_voice_converter.get_cached_speech(response_text, voice_language, slow)
+        if cached_speech is not None:
+            # Step 5: Return previously synthesized voice audio from the cache
+            cache_key, audio_path, audio_stat = cached_speech
+            headers["ETag"] = f'"{cache_key}"'
+            headers["Cache-Control"] = "private, max-age=86400"
+            if etag_matches(if_none_match, headers["ETag"]):
+                # The client already holds this audio; the X- headers still carry the texts
+                return Response(status_code=304, headers=headers)
+            return text_to_voice_converter.cached_file_response(audio_path, headers, stat_result=audio_stat)
+        
+        audio_stream = await text_to_voice_converter.stream_speech(
             response_text, 
             voice_language, 
             slow
         )
         
-        # Step 5: Return the voice file with metadata
-        if hasattr(voice_response, 'path'):
-            # Return the audio file with additional headers containing workflow info
-            return FileResponse(
-                voice_response.path,
-                media_type="audio/mpeg",
-                filename=f"response_{session_id or 'audio'}.mp3",
-                headers={
-                    "X-Original-Text": transcription_result.get("text", ""),
-                    "X-Response-Text": response_text,
-                    "X-Session-ID": session_id or "",
-                    "X-User-ID": user_id or "",
-                    "X-Channel": channel or "",
-                    "X-Workflow": "voice-to-voice-complete"
-                }
-            )
-        else:
-            return voice_response
+        # Step 5: Stream the voice audio as it is synthesized
+        return StreamingResponse(
+            audio_stream,
+            media_type="audio/mpeg",
+            headers=headers
+        )
             
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in voice-to-voice workflow: {str(e)}")
+        logger.error("Error in voice-to-voice workflow: %s", e)
         raise HTTPException(status_code=500, detail=f"Voice-to-voice workflow failed: {str(e)}")
-
-# Application lifecycle events
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup resources on application shutdown"""
-    logger.info("Shutting down application...")
-    await rest_api_client.close()
-    logger.info("REST API client closed successfully")
-
-
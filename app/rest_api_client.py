@@ -4,34 +4,131 @@ Handles HTTP requests to external services with transcribed text
 """
 import logging
 import asyncio
-from typing import Dict, Any, Optional, List
+import base64
+import os
+from typing import Dict, Any, Optional, List, Mapping, Set, Iterable, Sized
+import aiofiles
 import aiohttp
 from aiohttp import ClientSession, ClientTimeout, ClientError
-import json
+import orjson
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Upstream statuses meaning a batch payload is not understood by the endpoint
+BATCH_UNSUPPORTED_STATUSES = {400, 404, 405, 415, 422}
+
+# Bytes of an error response body kept in logs and error messages
+ERROR_BODY_LIMIT = 1024
+
+
+def build_envelope(
+    text: str,
+    session_id: Optional[str],
+    user_id: Optional[str],
+    channel: Optional[str],
+    metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Build the payload forwarded for a piece of user text
+    
+    Args:
+        text: Transcribed or typed text
+        session_id: Session the text belongs to
+        user_id: User who sent the text
+        channel: Channel the text came from
+        metadata: Optional processing metadata
+        
+    Returns:
+        Payload dictionary
+    """
+    payload = {
+        "text": text,
+        "session_id": session_id,
+        "user_id": user_id,
+        "channel": channel
+    }
+    if metadata is not None:
+        payload["metadata"] = metadata
+    return payload
+
 
 class RestApiClient:
     """REST API client for forwarding voice-to-text results"""
     
-    def __init__(self, timeout: int = 30):
+    def __init__(
+        self,
+        timeout: int = 30,
+        connect_timeout: int = 5,
+        connection_limit: int = 128,
+        connection_limit_per_host: int = 64,
+        keepalive_timeout: int = 75,
+        dns_cache_ttl: int = 300
+    ):
         """
         Initialize the REST API client
         
         Args:
             timeout: Request timeout in seconds
+            connect_timeout: Timeout in seconds for acquiring a connection
+            connection_limit: Maximum number of pooled connections
+            connection_limit_per_host: Maximum pooled connections to a single host
+            keepalive_timeout: Seconds an idle keep-alive connection is kept open
+            dns_cache_ttl: Seconds resolved host addresses are cached
         """
-        self.timeout = ClientTimeout(total=timeout)
+        self.timeout = ClientTimeout(total=timeout, connect=connect_timeout)
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
         self.session: Optional[ClientSession] = None
+        self.batch_urls: Set[str] = set()
+        self.multipart_audio_urls: Set[str] = set()
+    
+    async def connect(self) -> ClientSession:
+        """
+        Open the shared aiohttp session
+        
+        A single session (and its connection pool) is reused for every
+        forwarding call so keep-alive connections to the target host are
+        not re-established per request. Called once on application startup.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self.session = ClientSession(timeout=self.timeout, connector=connector)
+            logger.info("REST API client session opened")
+        return self.session
     
     async def _get_session(self) -> ClientSession:
-        """Get or create aiohttp session"""
+        """Get the shared aiohttp session, opening it if needed"""
         if self.session is None or self.session.closed:
-            self.session = ClientSession(timeout=self.timeout)
+            return await self.connect()
         return self.session
     
+    async def warmup(self, url: str, timeout: float = 2.0):
+        """
+        Open a keep-alive connection to a target before traffic arrives
+        
+        Issues a HEAD request so DNS resolution, TCP and TLS setup are paid
+        at startup instead of by the first forwarded request. Failures are
+        ignored since the target may not be up yet.
+        
+        Args:
+            url: Target API endpoint URL
+            timeout: Maximum seconds to wait for the target
+        """
+        session = await self._get_session()
+        try:
+            async with session.head(url, timeout=ClientTimeout(total=timeout)) as response:
+                logger.debug("Warmed up connection to %s (status %s)", url, response.status)
+        except (ClientError, asyncio.TimeoutError) as e:
+            logger.debug("Connection warmup to %s failed: %s", url, e)
+    
     async def close(self):
         """Close the aiohttp session"""
         if self.session and not self.session.closed:
@@ -41,7 +138,7 @@ class RestApiClient:
         self,
         url: str,
         transcription_data: Dict[str, Any],
-        headers: Optional[Dict[str, str]] = None,
+        headers: Optional[Mapping[str, str]] = None,
         method: str = "POST"
     ) -> Dict[str, Any]:
         """
@@ -56,37 +153,109 @@ class RestApiClient:
         Returns:
             Response data from the external API
         """
+        # Default headers
+        default_headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "channel-adapter/2.0.0"
+        }
+        
+        # Merge with provided headers
+        if headers:
+            default_headers.update(headers)
+        
+        logger.info("Sending transcription to %s", url)
+        
+        # Encode with orjson rather than letting aiohttp use the stdlib encoder
         try:
-            session = await self._get_session()
-            
-            # Default headers
-            default_headers = {
-                "Content-Type": "application/json",
-                "User-Agent": "channel-adapter/2.0.0"
+            body = orjson.dumps(transcription_data)
+        except orjson.JSONEncodeError as e:
+            logger.error("Unexpected error sending transcription: %s", e)
+            return {
+                "success": False,
+                "error": f"Unexpected error: {str(e)}",
+                "url": url,
+                "method": method.upper()
             }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Payload: %s", body.decode())
+        
+        return await self._request(url, body, default_headers, method)
+    
+    async def send_multipart_audio(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        audio_path: str,
+        headers: Optional[Mapping[str, str]] = None,
+        method: str = "POST"
+    ) -> Dict[str, Any]:
+        """
+        Send a payload with an audio file as multipart/form-data
+        
+        The payload goes in a JSON "metadata" part and the raw MP3 in an
+        "audio" part, instead of being base64-encoded into the JSON body.
+        The file is read without blocking the event loop.
+        
+        Args:
+            url: Target API endpoint URL registered with register_multipart_audio_endpoint
+            payload: Data sent as the metadata part
+            audio_path: Path of the MP3 file sent as the audio part
+            headers: Optional HTTP headers
+            method: HTTP method (POST, PUT, PATCH)
             
-            # Merge with provided headers
-            if headers:
-                default_headers.update(headers)
-            
-            logger.info(f"Sending transcription to {url}")
-            logger.debug(f"Payload: {json.dumps(transcription_data, indent=2)}")
+        Returns:
+            Response data from the external API
+        
+        Raises:
+            OSError: If the audio file cannot be opened
+        """
+        default_headers = {"User-Agent": "channel-adapter/2.0.0"}
+        if headers:
+            default_headers.update(headers)
+        # aiohttp sets the multipart Content-Type with its boundary
+        default_headers.pop("Content-Type", None)
+        
+        logger.info("Sending multipart audio payload to %s", url)
+        
+        async with aiofiles.open(audio_path, "rb") as audio_file:
+            audio_data = await audio_file.read()
+        
+        form = aiohttp.FormData()
+        form.add_field("metadata", orjson.dumps(payload), content_type="application/json")
+        form.add_field(
+            "audio",
+            audio_data,
+            filename=os.path.basename(audio_path),
+            content_type="audio/mpeg"
+        )
+        return await self._request(url, form, default_headers, method)
+    
+    async def _request(
+        self,
+        url: str,
+        data: Any,
+        headers: Dict[str, str],
+        method: str = "POST"
+    ) -> Dict[str, Any]:
+        """Send a request and turn the response or failure into a result dictionary"""
+        try:
+            session = await self._get_session()
             
             async with session.request(
                 method.upper(),
                 url,
-                json=transcription_data,
-                headers=default_headers
+                data=data,
+                headers=headers
             ) as response:
                 
-                response_text = await response.text()
-                logger.info(f"API response status: {response.status}")
+                # Read the body once and parse it as JSON regardless of Content-Type
+                body = await response.read()
+                logger.info("API response status: %d", response.status)
                 
-                # Try to parse JSON response
                 try:
-                    response_data = await response.json()
-                except json.JSONDecodeError:
-                    response_data = {"raw_response": response_text}
+                    response_data = orjson.loads(body)
+                except orjson.JSONDecodeError:
+                    response_data = {"raw_response": body.decode("utf-8", "replace")}
                 
                 result = {
                     "success": response.status < 400,
@@ -97,15 +266,16 @@ class RestApiClient:
                 }
                 
                 if response.status >= 400:
-                    logger.error(f"API call failed: {response.status} - {response_text}")
-                    result["error"] = f"HTTP {response.status}: {response_text}"
+                    error_text = body[:ERROR_BODY_LIMIT].decode("utf-8", "replace")
+                    logger.error("API call failed: %d - %s", response.status, error_text)
+                    result["error"] = f"HTTP {response.status}: {error_text}"
                 else:
                     logger.info("Transcription sent successfully")
                 
                 return result
                 
         except ClientError as e:
-            logger.error(f"Client error sending transcription: {str(e)}")
+            logger.error("Client error sending transcription: %s", e)
             return {
                 "success": False,
                 "error": f"Client error: {str(e)}",
@@ -113,7 +283,7 @@ class RestApiClient:
                 "method": method.upper()
             }
         except Exception as e:
-            logger.error(f"Unexpected error sending transcription: {str(e)}")
+            logger.error("Unexpected error sending transcription: %s", e)
             return {
                 "success": False,
                 "error": f"Unexpected error: {str(e)}",
@@ -121,60 +291,149 @@ class RestApiClient:
                 "method": method.upper()
             }
     
-    async def send_batch_transcriptions(
+    def register_multipart_audio_endpoint(self, url: str):
+        """
+        Mark an endpoint as accepting audio as multipart/form-data
+        
+        Text-to-voice results forwarded with audio to a registered URL are
+        sent with send_multipart_audio instead of base64 audio in JSON.
+        """
+        self.multipart_audio_urls.add(url)
+    
+    def register_batch_endpoint(self, url: str):
+        """
+        Mark an endpoint as accepting batched payloads
+        
+        Batches sent to a registered URL are POSTed once as {"items": [...]}
+        instead of one request per item. The endpoint must answer with
+        {"results": [...]} holding one result per item, in order.
+        """
+        self.batch_urls.add(url)
+    
+    async def send_batch_request(
         self,
         url: str,
         batch_data: List[Dict[str, Any]],
-        headers: Optional[Dict[str, str]] = None,
+        headers: Optional[Mapping[str, str]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Send multiple transcriptions in a single batched request
+        
+        Args:
+            url: Target API endpoint URL registered with register_batch_endpoint
+            batch_data: List of transcription results
+            headers: Optional HTTP headers
+            
+        Returns:
+            List of per-item results aligned by index, or None if the endpoint
+            turned out not to support batching
+        """
+        result = await self.send_transcription(url, {"items": batch_data}, headers)
+        status_code = result.get("status_code")
+        response_data = result.get("response_data")
+        sub_results = response_data.get("results") if isinstance(response_data, dict) else None
+        
+        if status_code in BATCH_UNSUPPORTED_STATUSES or (
+            result["success"] and (not isinstance(sub_results, list) or len(sub_results) != len(batch_data))
+        ):
+            logger.warning("Endpoint %s does not support batched requests, sending items individually", url)
+            self.batch_urls.discard(url)
+            return None
+        
+        if not result["success"]:
+            # Don't resend items one by one: the upstream may have processed part of the batch
+            return [
+                {**result, "index": i}
+                for i in range(len(batch_data))
+            ]
+        
+        return [
+            {
+                "success": True,
+                "status_code": status_code,
+                "response_data": sub_result,
+                "url": url,
+                "method": result["method"],
+                "index": i
+            }
+            for i, sub_result in enumerate(sub_results)
+        ]
+    
+    async def send_batch_transcriptions(
+        self,
+        url: str,
+        batch_data: Iterable[Dict[str, Any]],
+        headers: Optional[Mapping[str, str]] = None,
         concurrent_limit: int = 5
     ) -> List[Dict[str, Any]]:
         """
         Send multiple transcriptions concurrently
         
+        Uses a single batched request when the endpoint is registered as
+        batch-capable, and one request per item otherwise. Items are pulled
+        from batch_data as requests complete, so a generator is consumed
+        lazily and at most concurrent_limit payloads are in flight.
+        
         Args:
             url: Target API endpoint URL
-            batch_data: List of transcription results
+            batch_data: Iterable of transcription results
             headers: Optional HTTP headers
             concurrent_limit: Maximum concurrent requests
             
         Returns:
             List of response results
         """
-        semaphore = asyncio.Semaphore(concurrent_limit)
+        if url in self.batch_urls:
+            batch_data = list(batch_data)
+            if len(batch_data) > 1:
+                logger.info("Sending %d transcriptions to %s in one request", len(batch_data), url)
+                batch_results = await self.send_batch_request(url, batch_data, headers)
+                if batch_results is not None:
+                    return batch_results
         
-        async def send_single(data: Dict[str, Any]) -> Dict[str, Any]:
-            async with semaphore:
-                return await self.send_transcription(url, data, headers)
+        if isinstance(batch_data, list) and len(batch_data) <= 1:
+            # Nothing to overlap, send directly without the worker pool
+            if not batch_data:
+                return []
+            result = await self.send_transcription(url, batch_data[0], headers)
+            result["index"] = 0
+            return [result]
         
-        logger.info(f"Sending {len(batch_data)} transcriptions to {url}")
+        items = enumerate(batch_data)
+        results: Dict[int, Dict[str, Any]] = {}
         
-        try:
-            results = await asyncio.gather(
-                *[send_single(data) for data in batch_data],
-                return_exceptions=True
-            )
-            
-            # Handle any exceptions in results
-            processed_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    processed_results.append({
+        async def send_worker():
+            # Workers share one iterator, each pulling the next item when free
+            for i, data in items:
+                try:
+                    result = await self.send_transcription(url, data, headers)
+                except Exception as e:
+                    result = {
                         "success": False,
-                        "error": f"Exception: {str(result)}",
-                        "index": i,
+                        "error": f"Exception: {str(e)}",
                         "url": url
-                    })
-                else:
-                    result["index"] = i
-                    processed_results.append(result)
+                    }
+                result["index"] = i
+                results[i] = result
+        
+        logger.info("Sending transcriptions to %s", url)
+        
+        try:
+            # Workers beyond the connector's per-host limit would only queue for a connection
+            worker_count = max(1, min(concurrent_limit, self.connection_limit_per_host))
+            if isinstance(batch_data, Sized):
+                worker_count = min(worker_count, max(1, len(batch_data)))
+            await asyncio.gather(*[send_worker() for _ in range(worker_count)])
             
-            successful = len([r for r in processed_results if r.get("success", False)])
-            logger.info(f"Batch sending completed: {successful}/{len(batch_data)} successful")
+            processed_results = [results[i] for i in range(len(results))]
+            
+            successful = sum(1 for r in processed_results if r.get("success", False))
+            logger.info("Batch sending completed: %d/%d successful", successful, len(processed_results))
             
             return processed_results
             
         except Exception as e:
-            logger.error(f"Batch sending failed: {str(e)}")
+            logger.error("Batch sending failed: %s", e)
             return [{
                 "success": False,
                 "error": f"Batch operation failed: {str(e)}",
@@ -189,7 +448,7 @@ class RestApiClient:
         user_id: Optional[str] = None,
         channel: Optional[str] = None,
         include_metadata: bool = True,
-        headers: Optional[Dict[str, str]] = None
+        headers: Optional[Mapping[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Forward a voice-to-text result to external API with optional metadata
@@ -203,25 +462,22 @@ class RestApiClient:
         Returns:
             API call result
         """
-        # Prepare payload
-        payload = {
-            "text": transcription_result["text"],
-            "session_id": transcription_result["session_info"].get("session_id", session_id),
-            "user_id": transcription_result["session_info"].get("user_id", user_id),
-            "channel": transcription_result["session_info"].get("channel", channel),
-            # "source": "channel-adapter",
-            # "timestamp": transcription_result.get("timestamp", None)
-        }
-        
-        if include_metadata:
-            payload["metadata"] = {
-                "service": "channel-adapter",
-                "version": "2.0.0",
-                "conversion_engine": "google-speech-recognition",
-                "audio_format": transcription_result.get("format", "unknown"),
-                "language": transcription_result.get("language", "en-US")
-            }
+        session_info = transcription_result["session_info"]
+        metadata = {
+            "service": "channel-adapter",
+            "version": "2.0.0",
+            "conversion_engine": "google-speech-recognition",
+            "audio_format": transcription_result.get("format", "unknown"),
+            "language": transcription_result.get("language", "en-US")
+        } if include_metadata else None
         
+        payload = build_envelope(
+            transcription_result["text"],
+            session_info.get("session_id", session_id),
+            session_info.get("user_id", user_id),
+            session_info.get("channel", channel),
+            metadata
+        )
         return await self.send_transcription(target_url, payload, headers)
     
     async def forward_text_input_result(
@@ -233,7 +489,7 @@ class RestApiClient:
         user_id: Optional[str] = None,
         channel: Optional[str] = None,
         include_metadata: bool = True,
-        headers: Optional[Dict[str, str]] = None
+        headers: Optional[Mapping[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Forward a text-input result to external API
@@ -247,25 +503,15 @@ class RestApiClient:
         Returns:
             API call result
         """
-        # Prepare payload
-        payload = {
-            "text": text,
-            "session_id": session_id,
-            "user_id": user_id,
-            "channel": channel,
-            # "source": "channel-adapter",
-            # "timestamp": text_input_result.get("received_at", None)
-        }
-        
-        if include_metadata:
-            payload["metadata"] = {
-                "service": "channel-adapter",
-                "version": "2.0.0",
-                "processing_type": "text-input",
-                "original_source": text_input_result.get("source", "unknown"),
-                "text_length": text_input_result.get("text_length", 0)
-            }
+        metadata = {
+            "service": "channel-adapter",
+            "version": "2.0.0",
+            "processing_type": "text-input",
+            "original_source": text_input_result.get("source", "unknown"),
+            "text_length": text_input_result.get("text_length", 0)
+        } if include_metadata else None
         
+        payload = build_envelope(text, session_id, user_id, channel, metadata)
         return await self.send_transcription(target_url, payload, headers)
     
     async def forward_text_to_voice_result(
@@ -274,7 +520,7 @@ class RestApiClient:
         target_url: str,
         include_audio_data: bool = False,
         include_metadata: bool = True,
-        headers: Optional[Dict[str, str]] = None
+        headers: Optional[Mapping[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Forward a text-to-voice result to external API
@@ -282,15 +528,14 @@ class RestApiClient:
         Args:
             tts_result: Result from text-to-voice conversion
             target_url: External API endpoint
-            include_audio_data: Whether to include audio file data (base64 encoded)
+            include_audio_data: Whether to include audio file data (base64 encoded,
+                or as a multipart part for registered multipart endpoints)
             include_metadata: Whether to include conversion metadata
             headers: Optional HTTP headers
             
         Returns:
             API call result
         """
-        import base64
-        
         # Prepare payload
         payload = {
             "text_to_voice": tts_result,
@@ -298,19 +543,6 @@ class RestApiClient:
             "timestamp": None
         }
         
-        # Include audio data if requested and available
-        if include_audio_data and "file_path" in tts_result:
-            try:
-                with open(tts_result["file_path"], "rb") as audio_file:
-                    audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
-                    payload["audio_data"] = {
-                        "data": audio_data,
-                        "format": "mp3",
-                        "encoding": "base64"
-                    }
-            except Exception as e:
-                logger.warning(f"Failed to include audio data: {str(e)}")
-        
         if include_metadata:
             payload["metadata"] = {
                 "service": "channel-adapter",
@@ -323,6 +555,26 @@ class RestApiClient:
                 "file_size_bytes": tts_result.get("file_size_bytes", 0)
             }
         
+        # Include audio data if requested and available
+        if include_audio_data and "file_path" in tts_result:
+            if target_url in self.multipart_audio_urls:
+                try:
+                    return await self.send_multipart_audio(target_url, payload, tts_result["file_path"], headers)
+                except OSError as e:
+                    logger.warning("Failed to include audio data: %s", e)
+                    return await self.send_transcription(target_url, payload, headers)
+            
+            try:
+                async with aiofiles.open(tts_result["file_path"], "rb") as audio_file:
+                    audio_data = base64.b64encode(await audio_file.read()).decode('utf-8')
+                payload["audio_data"] = {
+                    "data": audio_data,
+                    "format": "mp3",
+                    "encoding": "base64"
+                }
+            except Exception as e:
+                logger.warning("Failed to include audio data: %s", e)
+        
         return await self.send_transcription(target_url, payload, headers)
 
 
@@ -0,0 +1,48 @@
+"""
+Request and response schemas for the Channel Adapter API
+Pydantic models describing JSON request bodies and the forwarding endpoint responses
+"""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, ConfigDict
+
+
+class TextInputRequest(BaseModel):
+    """JSON body of the text input endpoint"""
+    
+    text: str
+    source: Optional[str] = "ui"
+    timestamp: Optional[str] = None
+
+
+class TextToVoiceBatchRequest(BaseModel):
+    """JSON body of the batch text-to-voice endpoint"""
+    
+    texts: List[str]
+    language: str = "en"
+    slow: bool = False
+    concurrent_limit: int = 3
+
+
+class ForwardingResponse(BaseModel):
+    """Response of a single-item forwarding endpoint"""
+    
+    # The original processing result is returned under an operation-specific
+    # key ("transcription", "text_input", "text_to_voice")
+    model_config = ConfigDict(extra="allow")
+    
+    forward_result: Dict[str, Any]
+    success: bool
+    cached: bool = False
+
+
+class BatchForwardingResponse(BaseModel):
+    """Response of a batch forwarding endpoint"""
+    
+    # The batch processing result is returned under an operation-specific
+    # "<operation>_results" key
+    model_config = ConfigDict(extra="allow")
+    
+    forward_results: List[Dict[str, Any]]
+    total_items: int
+    successful_forwards: int
+    success: bool
@@ -2,17 +2,100 @@
 Text-to-Voice conversion module using Google Text-to-Speech (gTTS)
 Handles text-to-speech conversion with various output options
 """
+import asyncio
+import base64
 import tempfile
 import os
 import logging
-from typing import List, Dict, Any
-from gtts import gTTS
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Set, Tuple
+import aiofiles
+import aiohttp
+from aiohttp import ClientSession, ClientTimeout
+from gtts import gTTS, gTTSError
+from gtts.lang import _fallback_deprecated_lang, tts_langs
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.cache import AudioCache, InFlightAudio
+from app.utils import content_disposition, etag_matches
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# On-disk cache for synthesized speech, keyed by (text, language, slow)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tts_cache"))
+TTS_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Internal location under which a reverse proxy (nginx X-Accel-Redirect) serves
+# TTS_CACHE_DIR, e.g. "/tts-cache/". Unset sends cached files from Python.
+TTS_CACHE_ACCEL_PREFIX: Optional[str] = os.getenv("TTS_CACHE_ACCEL_PREFIX") or None
+
+# Limits checked before any synthesis work is done
+MAX_TEXT_LENGTH = 5000
+MAX_BATCH_TEXTS = 5
+MAX_WARM_TEXTS = 50
+
+# Chunk size used when streaming cached audio
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Host gTTS sends synthesis requests to
+GTTS_HOST = "translate.google.com"
+
+# Timeout in seconds for a single gTTS request
+GTTS_TIMEOUT = 30
+
+# Parts of one text requested from gTTS at the same time
+GTTS_PART_CONCURRENCY = max(1, int(os.getenv("GTTS_PART_CONCURRENCY", "4")))
+
+# Audio payload within a line of a gTTS response, as matched by gTTS.stream();
+# private to gTTS, which is why requirements.txt pins its version
+GTTS_AUDIO_PATTERN = re.compile(rb'jQ1olc","\[\\"(.*)\\"]')
+
+# gTTS versions exposing their prepared requests are sent over aiohttp;
+# otherwise gTTS's own blocking client is run in a worker thread
+GTTS_ASYNC_SUPPORTED = hasattr(gTTS, "_prepare_requests")
+
+
+@lru_cache(maxsize=64)
+def _tts_raw_headers(language: str, slow: bool) -> Tuple[Tuple[bytes, bytes], ...]:
+    """Encoded X-TTS-Engine/X-Language/X-Slow headers, built once per (language, slow)"""
+    return (
+        (b"x-tts-engine", b"gTTS"),
+        (b"x-language", language.encode("latin-1")),
+        (b"x-slow", str(slow).encode("latin-1")),
+    )
+
+
+@lru_cache(maxsize=64)
+def _resolve_language(language: str) -> str:
+    """
+    Check a language against gTTS's supported languages, once per language
+    
+    gTTS rebuilds its language table on every instantiation when lang_check is
+    on; resolving here lets gTTS be created with lang_check=False.
+    """
+    resolved = _fallback_deprecated_lang(language)
+    if resolved not in tts_langs():
+        raise ValueError(f"Language not supported: {language}")
+    return resolved
+
+
+def _parse_gtts_audio(body: bytes) -> Iterator[bytes]:
+    """Extract the MP3 audio from a gTTS response body, as gTTS.stream() does"""
+    for line in body.splitlines():
+        if b"jQ1olc" in line:
+            audio_search = GTTS_AUDIO_PATTERN.search(line)
+            if not audio_search:
+                raise gTTSError("No audio stream in gTTS response")
+            yield base64.b64decode(audio_search.group(1))
+
+
+def _preview(text: str, limit: int = 100) -> str:
+    """Text shortened to limit characters for batch results"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
 
 class TextToVoiceConverter:
     """Text-to-Voice converter using Google Text-to-Speech (gTTS)"""
@@ -21,55 +104,384 @@ class TextToVoiceConverter:
         """Initialize the text-to-voice converter"""
         self.tts_engine = "gTTS"
         self.output_format = "mp3"
+        self.cache = AudioCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+        self.session: Optional[ClientSession] = None
+        self._synthesis_tasks: Set[asyncio.Task] = set()
+        self._warmup_task: Optional[asyncio.Task] = None
+    
+    async def _get_session(self) -> ClientSession:
+        """Get the aiohttp session used for gTTS requests, opening it if needed"""
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(
+                timeout=ClientTimeout(total=GTTS_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=60),
+                trust_env=True
+            )
+        return self.session
+    
+    async def close(self):
+        """Stop running syntheses and close the gTTS HTTP session"""
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+        for task in self._synthesis_tasks:
+            task.cancel()
+        await asyncio.gather(*self._synthesis_tasks, return_exceptions=True)
+        if self.session and not self.session.closed:
+            await self.session.close()
+    
+    async def warmup(self):
+        """
+        Prepare for an upcoming synthesis
+        
+        Opens a keep-alive connection to the gTTS host ahead of time so DNS,
+        TCP and TLS setup overlap with other I/O. Failures are ignored.
+        """
+        try:
+            if GTTS_ASYNC_SUPPORTED:
+                session = await self._get_session()
+                async with session.head(f"https://{GTTS_HOST}/"):
+                    pass
+            else:
+                await asyncio.get_running_loop().getaddrinfo(GTTS_HOST, 443)
+        except Exception as e:
+            logger.debug("gTTS warmup failed: %s", e)
+    
+    def schedule_warmup(self):
+        """
+        Run warmup in the background without waiting for it
+        
+        Callers stay off the gTTS host's latency; at most one warmup runs at
+        a time.
+        """
+        if self._warmup_task is None or self._warmup_task.done():
+            self._warmup_task = asyncio.create_task(self.warmup())
+    
+    def _validate_text(self, text: str):
+        """Reject text too long to synthesize before calling gTTS"""
+        if len(text) > MAX_TEXT_LENGTH:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Text exceeds maximum length of {MAX_TEXT_LENGTH} characters"
+            )
+    
+    async def _synthesize_parts(self, text: str, language: str, slow: bool) -> AsyncIterator[bytes]:
+        """
+        Synthesize text with gTTS, yielding the MP3 parts as they arrive
+        
+        gTTS splits text into parts of up to 100 characters at sentence and
+        clause boundaries and requests each one separately. The requests gTTS
+        prepares are sent over a shared aiohttp session, several parts at a
+        time, so later parts are synthesized while earlier ones are consumed
+        and concurrent syntheses overlap on the event loop.
+        """
+        tts = gTTS(text=text, lang=_resolve_language(language), slow=slow, lang_check=False)
+        if not GTTS_ASYNC_SUPPORTED:
+            parts = tts.stream()
+            while (part := await asyncio.to_thread(next, parts, None)) is not None:
+                yield part
+            return
+        
+        session = await self._get_session()
+        semaphore = asyncio.Semaphore(GTTS_PART_CONCURRENCY)
+        
+        async def fetch_part(request) -> List[bytes]:
+            headers = {
+                name: value for name, value in request.headers.items()
+                if name.lower() != "content-length"
+            }
+            async with semaphore:
+                async with session.post(request.url, data=request.body, headers=headers) as response:
+                    if response.status >= 400:
+                        raise gTTSError(f"gTTS request failed with HTTP {response.status}")
+                    body = await response.read()
+            return list(_parse_gtts_audio(body))
+        
+        # Parts are requested concurrently (semaphore waiters start in order)
+        # and yielded in text order as each one completes. A failed part fails
+        # the whole text as soon as it is seen, even while earlier parts are
+        # still pending, so no audio is published for a text that cannot complete.
+        tasks = [asyncio.create_task(fetch_part(request)) for request in tts._prepare_requests()]
+        try:
+            for index, task in enumerate(tasks):
+                while not task.done():
+                    await asyncio.wait(tasks[index:], return_when=asyncio.FIRST_COMPLETED)
+                    for other in tasks[index + 1:]:
+                        if other.done() and other.exception() is not None:
+                            raise other.exception()
+                for part in task.result():
+                    yield part
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _start_synthesis(self, key: str, text: str, language: str, slow: bool) -> InFlightAudio:
+        """
+        Join the running synthesis of a key, or start one
+        
+        The synthesis is registered before its first part is requested and
+        stays registered until the audio is stored in the cache, so identical
+        requests arriving meanwhile share its parts instead of calling gTTS
+        again. It runs in its own task, independent of the requests reading it,
+        and completes even if they all go away.
+        """
+        in_flight = self.cache.in_flight(key)
+        if in_flight is None:
+            in_flight = self.cache.start_in_flight(key)
+            task = asyncio.create_task(self._run_synthesis(key, in_flight, text, language, slow))
+            self._synthesis_tasks.add(task)
+            task.add_done_callback(self._synthesis_tasks.discard)
+        return in_flight
+    
+    async def _run_synthesis(
+        self,
+        key: str,
+        in_flight: InFlightAudio,
+        text: str,
+        language: str,
+        slow: bool
+    ):
+        """Synthesize text into an in-flight entry and store the result in the cache"""
+        try:
+            async for part in self._synthesize_parts(text, language, slow):
+                in_flight.publish(part)
+            audio_data = b"".join(in_flight.parts)
+            if not audio_data:
+                raise HTTPException(status_code=500, detail="Failed to generate audio file")
+            # Writing and evicting touch the whole cache directory, keep them off the event loop
+            audio_path = await asyncio.to_thread(self.cache.store, key, audio_data)
+        except asyncio.CancelledError:
+            in_flight.finish(error=HTTPException(status_code=503, detail="Speech synthesis was cancelled"))
+            raise
+        except Exception as e:
+            logger.error("Error in gTTS conversion: %s", e)
+            in_flight.finish(error=e)
+        else:
+            in_flight.finish(audio_path=audio_path)
+        finally:
+            self.cache.end_in_flight(key)
+    
+    async def _get_or_synthesize(
+        self,
+        text: str,
+        language: str,
+        slow: bool
+    ) -> Tuple[str, str, Optional[bytes]]:
+        """
+        Get the cached audio for a request, synthesizing it on a miss
+        
+        Args:
+            text: Text to convert to speech
+            language: Language code for gTTS
+            slow: Whether to use slow speech
+            
+        Returns:
+            Tuple of (cache key, path of the cached MP3 file, MP3 bytes if they
+            were synthesized for this call and are still in memory)
+        """
+        key = self.cache.make_key(text, language, slow)
+        audio_path = self.cache.get(key)
+        if audio_path is not None:
+            return key, audio_path, None
+        
+        # Joins a synthesis of the same audio already running, e.g. a stream
+        in_flight = self._start_synthesis(key, text, language, slow)
+        audio_data = await in_flight.result()
+        return key, in_flight.audio_path, audio_data
     
     async def convert_to_speech(
         self, 
         text: str, 
         language: str = "en", 
-        slow: bool = False
-    ) -> FileResponse:
+        slow: bool = False,
+        if_none_match: Optional[str] = None
+    ) -> Response:
         """
-        Convert text to speech and return as FileResponse
+        Convert text to speech and return the MP3 audio
+        
+        Uncached audio is streamed as it is synthesized; cached audio is sent
+        from the cache file. A client already holding the audio gets 304.
         
         Args:
             text: Text to convert to speech
             language: Language code for gTTS (e.g., 'en', 'es', 'fr')
             slow: Whether to use slow speech
+            if_none_match: If-None-Match request header
             
         Returns:
-            FileResponse with the generated MP3 audio file
+            Response with the generated MP3 audio
         """
+        self._validate_text(text)
+        
+        key = self.cache.make_key(text, language, slow)
+        filename = f"speech_{key}.mp3"
+        
         try:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                temp_filename = temp_file.name
-            
-            # Generate speech using gTTS
-            tts = gTTS(text=text, lang=language, slow=slow)
-            tts.save(temp_filename)
+            # The cache key is stable across processes, so it doubles as the ETag
+            headers = {"ETag": f'"{key}"', "Cache-Control": "private, max-age=86400"}
+            if etag_matches(if_none_match, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
             
-            # Check if file was created and has content
-            if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 0:
-                filename = f"speech_{hash(text[:50])}.mp3"
-                
-                return FileResponse(
-                    path=temp_filename,
-                    filename=filename,
-                    media_type="audio/mpeg",
-                    headers={
-                        "X-TTS-Engine": "gTTS",
-                        "X-Language": language,
-                        "X-Slow": str(slow),
-                        "X-Text-Length": str(len(text))
-                    }
-                )
+            audio_path = self.cache.get(key)
+            if audio_path is None:
+                # Stream the audio so the client can start playback before
+                # synthesis has finished, sharing any identical synthesis in flight
+                audio_stream = await self.stream_speech(text, language, slow)
+                headers["Content-Disposition"] = content_disposition(filename)
+                response = StreamingResponse(audio_stream, media_type="audio/mpeg", headers=headers)
             else:
-                raise HTTPException(status_code=500, detail="Failed to generate audio file")
-                
+                response = self.cached_file_response(audio_path, headers, filename)
+            
+            response.raw_headers.extend(_tts_raw_headers(language, slow))
+            response.raw_headers.append((b"x-text-length", str(len(text)).encode("latin-1")))
+            return response
+        
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error in gTTS conversion: {str(e)}")
+            logger.error("Error in gTTS conversion: %s", e)
             raise HTTPException(status_code=500, detail=f"gTTS conversion failed: {str(e)}")
     
+    def cached_file_response(
+        self,
+        audio_path: str,
+        headers: Dict[str, str],
+        filename: Optional[str] = None,
+        stat_result: Optional[os.stat_result] = None
+    ) -> Response:
+        """
+        Build the response sending an audio file from the cache
+        
+        With TTS_CACHE_ACCEL_PREFIX set, the body is left to the reverse proxy
+        through X-Accel-Redirect so it is sent from the page cache with
+        sendfile; otherwise FileResponse streams it from Python. Both carry
+        the same headers.
+        
+        Args:
+            audio_path: Path of the cached MP3 file
+            headers: Response headers
+            filename: Download filename for the Content-Disposition header
+            stat_result: Precomputed stat of the file, saves FileResponse a stat call
+            
+        Returns:
+            Response for the cached audio
+        """
+        if stat_result is None:
+            # Stat up front so the headers are complete before sending
+            stat_result = os.stat(audio_path)
+        
+        response = FileResponse(
+            path=audio_path,
+            filename=filename,
+            media_type="audio/mpeg",
+            headers=headers,
+            stat_result=stat_result
+        )
+        if not TTS_CACHE_ACCEL_PREFIX:
+            return response
+        
+        # Send the file response's headers without its body; the upstream body
+        # is empty, so the proxy sets the file's Content-Length itself
+        accel_headers = {
+            name: value for name, value in response.headers.items()
+            if name != "content-length"
+        }
+        accel_headers["x-accel-redirect"] = f"{TTS_CACHE_ACCEL_PREFIX}{os.path.basename(audio_path)}"
+        return Response(headers=accel_headers)
+    
+    def get_cached_speech(
+        self,
+        text: str,
+        language: str = "en",
+        slow: bool = False
+    ) -> Optional[Tuple[str, str, os.stat_result]]:
+        """
+        Look up previously synthesized speech in the cache
+        
+        Args:
+            text: Text that was converted to speech
+            language: Language code for gTTS
+            slow: Whether slow speech was used
+            
+        Returns:
+            Tuple of (cache key, file path, file stat), or None if not cached
+        """
+        key = self.cache.make_key(text, language, slow)
+        audio_path = self.cache.get(key)
+        if audio_path is None:
+            return None
+        try:
+            return key, audio_path, os.stat(audio_path)
+        except FileNotFoundError:
+            return None
+    
+    async def stream_speech(
+        self,
+        text: str,
+        language: str = "en",
+        slow: bool = False
+    ) -> AsyncIterator[bytes]:
+        """
+        Convert text to speech and stream the MP3 audio as it is synthesized
+        
+        gTTS synthesizes long text in sentence-sized parts, so each part is
+        yielded as soon as it arrives instead of waiting for the whole text.
+        The first part is fetched before returning so synthesis errors are
+        raised as an HTTPException rather than cutting the stream short.
+        Cached audio is streamed from disk, and freshly synthesized audio is
+        added to the cache once synthesis completes. If the same audio is
+        being synthesized for another request, its parts are streamed too
+        rather than calling gTTS a second time.
+        
+        Args:
+            text: Text to convert to speech
+            language: Language code for gTTS
+            slow: Whether to use slow speech
+            
+        Returns:
+            Async iterator over MP3 audio chunks
+        """
+        key = self.cache.make_key(text, language, slow)
+        audio_path = self.cache.get(key)
+        if audio_path is not None:
+            audio_file = await aiofiles.open(audio_path, "rb")
+            return self._iterate_file(audio_file)
+        
+        parts = self._start_synthesis(key, text, language, slow).iterate()
+        try:
+            first_part = await anext(parts, None)
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Already logged by the synthesis task
+            raise HTTPException(status_code=500, detail=f"gTTS conversion failed: {str(e)}")
+        
+        if not first_part:
+            raise HTTPException(status_code=500, detail="Failed to generate audio file")
+        
+        return self._iterate_parts(first_part, parts)
+    
+    async def _iterate_parts(
+        self,
+        first_part: bytes,
+        parts: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        """Yield synthesized parts as gTTS produces them"""
+        try:
+            yield first_part
+            async for part in parts:
+                yield part
+        finally:
+            await parts.aclose()
+    
+    async def _iterate_file(self, audio_file) -> AsyncIterator[bytes]:
+        """Yield the contents of an open cached audio file in chunks"""
+        try:
+            while chunk := await audio_file.read(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await audio_file.close()
+    
     async def convert_to_speech_info(
         self, 
         text: str, 
@@ -87,47 +499,79 @@ class TextToVoiceConverter:
         Returns:
             Dictionary with conversion information
         """
+        self._validate_text(text)
+        
         try:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                temp_filename = temp_file.name
-            
-            # Generate speech using gTTS
-            tts = gTTS(text=text, lang=language, slow=slow)
-            tts.save(temp_filename)
+            _, audio_path, audio_data = await self._get_or_synthesize(text, language, slow)
+            file_size = len(audio_data) if audio_data is not None else os.path.getsize(audio_path)
             
-            # Check if file was created and has content
-            if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 0:
-                file_size = os.path.getsize(temp_filename)
-                
-                # Clean up the temporary file since we're not returning it
-                os.unlink(temp_filename)
-                
-                return {
-                    "success": True,
-                    "message": "Text-to-speech conversion successful",
-                    "text_length": len(text),
-                    "language": language,
-                    "slow": slow,
-                    "file_size_bytes": file_size,
-                    "tts_engine": "gTTS",
-                    "output_format": "mp3"
-                }
-            else:
-                # Clean up the temporary file
-                if os.path.exists(temp_filename):
-                    os.unlink(temp_filename)
-                raise HTTPException(status_code=500, detail="Failed to generate audio file")
+            return {
+                "success": True,
+                "message": "Text-to-speech conversion successful",
+                "text_length": len(text),
+                "language": language,
+                "slow": slow,
+                "file_size_bytes": file_size,
+                "tts_engine": "gTTS",
+                "output_format": "mp3"
+            }
                 
         except Exception as e:
-            logger.error(f"Error in gTTS conversion: {str(e)}")
+            logger.error("Error in gTTS conversion: %s", e)
             raise HTTPException(status_code=500, detail=f"gTTS conversion failed: {str(e)}")
     
+    async def warm_cache(
+        self,
+        texts: List[str],
+        language: str = "en",
+        slow: bool = False,
+        concurrent_limit: int = 3
+    ) -> Dict[str, Any]:
+        """
+        Synthesize known phrases ahead of time so later requests hit the cache
+        
+        Args:
+            texts: Phrases to synthesize
+            language: Language code for gTTS
+            slow: Whether to use slow speech
+            concurrent_limit: Maximum number of phrases synthesized at once
+            
+        Returns:
+            Dictionary with the number of phrases cached and failed
+        """
+        if len(texts) > MAX_WARM_TEXTS:
+            raise HTTPException(status_code=400, detail=f"Maximum {MAX_WARM_TEXTS} texts allowed per warmup")
+        for text in texts:
+            self._validate_text(text)
+        
+        semaphore = asyncio.Semaphore(max(1, concurrent_limit))
+        
+        async def warm_single(text: str):
+            async with semaphore:
+                await self._get_or_synthesize(text, language, slow)
+        
+        results = await asyncio.gather(
+            *[warm_single(text) for text in texts],
+            return_exceptions=True
+        )
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        if failed:
+            logger.warning("Failed to cache %d of %d phrases", failed, len(texts))
+        
+        return {
+            "success": True,
+            "cached": len(texts) - failed,
+            "failed": failed,
+            "language": language,
+            "slow": slow
+        }
+    
     async def convert_batch_to_speech(
         self, 
         texts: List[str], 
         language: str = "en", 
-        slow: bool = False
+        slow: bool = False,
+        concurrent_limit: int = 3
     ) -> Dict[str, Any]:
         """
         Convert multiple texts to speech
@@ -136,73 +580,81 @@ class TextToVoiceConverter:
             texts: List of texts to convert to speech
             language: Language code for gTTS
             slow: Whether to use slow speech
+            concurrent_limit: Maximum number of texts converted at once
             
         Returns:
             Dictionary with batch conversion results
         """
-        results = []
+        if len(texts) > MAX_BATCH_TEXTS:
+            raise HTTPException(status_code=400, detail=f"Maximum {MAX_BATCH_TEXTS} texts allowed per batch")
+        for text in texts:
+            self._validate_text(text)
+        
+        semaphore = asyncio.Semaphore(max(1, concurrent_limit))
+        
+        async def convert_single(i: int, text: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._convert_batch_item(i, text, language, slow)
         
         try:
-            for i, text in enumerate(texts):
-                try:
-                    # Create a temporary file for each text
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                        temp_filename = temp_file.name
-                    
-                    # Generate speech using gTTS
-                    tts = gTTS(text=text, lang=language, slow=slow)
-                    tts.save(temp_filename)
-                    
-                    # Check if file was created and has content
-                    if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 0:
-                        file_size = os.path.getsize(temp_filename)
-                        filename = f"batch_speech_{i}_{hash(text[:30])}.mp3"
-                        
-                        results.append({
-                            "success": True,
-                            "index": i,
-                            "text": text[:100] + "..." if len(text) > 100 else text,
-                            "text_length": len(text),
-                            "file_path": temp_filename,
-                            "filename": filename,
-                            "file_size_bytes": file_size,
-                            "language": language,
-                            "slow": slow
-                        })
-                    else:
-                        # Clean up failed file
-                        if os.path.exists(temp_filename):
-                            os.unlink(temp_filename)
-                        results.append({
-                            "success": False,
-                            "index": i,
-                            "text": text[:100] + "..." if len(text) > 100 else text,
-                            "error": "Failed to generate audio file"
-                        })
-                        
-                except Exception as e:
-                    results.append({
-                        "success": False,
-                        "index": i,
-                        "text": text[:100] + "..." if len(text) > 100 else text,
-                        "error": str(e)
-                    })
+            results = await asyncio.gather(
+                *[convert_single(i, text) for i, text in enumerate(texts)]
+            )
             
-            successful_results = [r for r in results if r["success"]]
-            failed_results = [r for r in results if not r["success"]]
+            successful_conversions = sum(1 for r in results if r["success"])
             
             return {
                 "success": True,
                 "total_texts": len(texts),
-                "successful_conversions": len(successful_results),
-                "failed_conversions": len(failed_results),
+                "successful_conversions": successful_conversions,
+                "failed_conversions": len(results) - successful_conversions,
                 "tts_engine": "gTTS",
-                "results": results
+                "results": list(results)
             }
             
         except Exception as e:
-            logger.error(f"Error in batch gTTS conversion: {str(e)}")
+            logger.error("Error in batch gTTS conversion: %s", e)
             raise HTTPException(status_code=500, detail=f"Batch gTTS conversion failed: {str(e)}")
+    
+    async def _convert_batch_item(
+        self,
+        i: int,
+        text: str,
+        language: str,
+        slow: bool
+    ) -> Dict[str, Any]:
+        """Convert a single batch entry, returning a success or failure result"""
+        text_preview = _preview(text)
+        try:
+            key, audio_path, audio_data = await self._get_or_synthesize(text, language, slow)
+            file_size = len(audio_data) if audio_data is not None else os.path.getsize(audio_path)
+            
+            return {
+                "success": True,
+                "index": i,
+                "text": text_preview,
+                "text_length": len(text),
+                "file_path": audio_path,
+                "filename": f"batch_speech_{i}_{key}.mp3",
+                "file_size_bytes": file_size,
+                "language": language,
+                "slow": slow
+            }
+                
+        except HTTPException as e:
+            return {
+                "success": False,
+                "index": i,
+                "text": text_preview,
+                "error": e.detail
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "index": i,
+                "text": text_preview,
+                "error": str(e)
+            }
 
 
 # Create a global instance for use in the main application
@@ -3,30 +3,71 @@ Utility functions for the Channel Adapter API
 Common functions used across multiple endpoints
 """
 import logging
-from typing import Optional, Dict, Any, List
+import os
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping
+from urllib.parse import quote
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
-def parse_custom_headers(custom_headers: Optional[str]) -> Optional[Dict[str, str]]:
+# One "key:value" pair of a custom headers string, surrounding whitespace excluded
+CUSTOM_HEADER_PATTERN = re.compile(r'\s*([^:,]+?)\s*:\s*([^,]+?)\s*(?:,|$)')
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Read an on/off setting from the environment.
+    
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset
+        
+    Returns:
+        True for "1", "true", "yes" or "on" (any case), False for other values
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def env_list(name: str, separator: str = "|") -> List[str]:
+    """
+    Read a list setting from the environment.
+    
+    Args:
+        name: Environment variable name
+        separator: Separator between items
+        
+    Returns:
+        Items with surrounding whitespace removed, empty items skipped
+    """
+    items = (item.strip() for item in os.getenv(name, "").split(separator))
+    return [item for item in items if item]
+
+@lru_cache(maxsize=256)
+def parse_custom_headers(custom_headers: Optional[str]) -> Optional[Mapping[str, str]]:
     """
     Parse custom headers from string format to dictionary.
     
+    Results are cached since clients tend to send the same header string
+    with every request, so the returned mapping is read-only.
+    
     Args:
         custom_headers: String in format "key1:value1,key2:value2"
         
     Returns:
-        Dictionary of headers or None if parsing fails
+        Read-only mapping of headers or None if parsing fails
     """
     if not custom_headers:
         return None
         
-    try:
-        headers = dict(item.split(":") for item in custom_headers.split(","))
-        return {k.strip(): v.strip() for k, v in headers.items()}
-    except Exception:
+    headers = dict(CUSTOM_HEADER_PATTERN.findall(custom_headers))
+    if not headers:
         logger.warning("Failed to parse custom headers, using defaults")
         return None
+    return MappingProxyType(headers)
 
 def create_standard_response(
     success: bool,
@@ -46,7 +87,7 @@ def create_standard_response(
     Returns:
         Standardized response dictionary
     """
-    response = {"success": success}
+    response: Dict[str, Any] = {"success": success}
     
     if data is not None:
         response["data"] = data
@@ -60,7 +101,8 @@ def create_standard_response(
 def create_forwarding_response(
     original_result: Dict[str, Any],
     forward_result: Dict[str, Any],
-    operation_name: str
+    operation_name: str,
+    cached: bool = False
 ) -> Dict[str, Any]:
     """
     Create a standardized forwarding response.
@@ -69,6 +111,7 @@ def create_forwarding_response(
         original_result: Result from the original processing operation
         forward_result: Result from the forwarding operation
         operation_name: Name of the operation for the response key
+        cached: Whether the forward result was served from cache
         
     Returns:
         Standardized forwarding response
@@ -76,7 +119,8 @@ def create_forwarding_response(
     return {
         operation_name: original_result,
         "forward_result": forward_result,
-        "success": forward_result.get("success", False)
+        "success": forward_result.get("success", False),
+        "cached": cached
     }
 
 def create_batch_forwarding_response(
@@ -101,7 +145,7 @@ def create_batch_forwarding_response(
     else:
         total_items = 1 if batch_result else 0
     
-    successful_forwards = len([r for r in forward_results if r.get("success", False)])
+    successful_forwards = sum(1 for r in forward_results if r.get("success", False))
     
     return {
         f"{operation_name}_results": batch_result,
@@ -123,9 +167,65 @@ def handle_api_error(operation: str, error: Exception) -> HTTPException:
         HTTPException with formatted error message
     """
     error_message = f"{operation} failed: {str(error)}"
-    logger.error(f"Error in {operation}: {str(error)}")
+    logger.error("Error in %s: %s", operation, error)
     return HTTPException(status_code=500, detail=error_message)
 
+def content_disposition(filename: str) -> str:
+    """
+    Build an attachment Content-Disposition header value.
+    
+    Filenames that are not plain header-safe ASCII (non-Latin characters,
+    quotes) are percent-encoded into an RFC 5987 filename* parameter, the
+    same way Starlette's FileResponse does.
+    
+    Args:
+        filename: Download filename, possibly derived from client input
+    
+    Returns:
+        Header value safe to encode as latin-1
+    """
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+def encode_header_text(value: str) -> str:
+    """
+    Percent-encode free text for use as a response header value.
+    
+    Header values are sent as latin-1, so session ids and transcript or
+    agent text in other scripts (or with emoji, curly quotes, line breaks)
+    are sent as percent-encoded UTF-8 instead.
+    
+    Args:
+        value: Text taken from the client or the external API
+    
+    Returns:
+        Header value safe to encode as latin-1, decodable with urllib.parse.unquote
+    """
+    return quote(value, safe="")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match request header against a response ETag.
+    
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so
+    "W/" prefixes are ignored; "*" matches any ETag.
+    
+    Args:
+        if_none_match: If-None-Match header value, None when absent
+        etag: Quoted ETag of the response
+    
+    Returns:
+        True if the client already holds this representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
 def create_transcription_result_format(
     text: str,
     language: str = "en-US",
@@ -175,6 +275,24 @@ def create_text_input_result_format(
         "processed_text": text.strip()
     }
 
+def extract_agent_response(response_data: Any) -> Optional[str]:
+    """
+    Extract the agent reply from an external API response.
+    
+    Args:
+        response_data: Parsed response body, expected as {"response": {"agent_response": ...}}
+        
+    Returns:
+        The agent response, "" if it is empty or null, or None if the
+        response has another format
+    """
+    try:
+        agent_response = response_data["response"]["agent_response"]
+    except (KeyError, TypeError):
+        return None
+    # A present but null reply is an empty reply, not a malformed response
+    return "" if agent_response is None else agent_response
+
 def extract_successful_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Extract only successful results from a list of results.
@@ -4,32 +4,202 @@ Handles audio file processing and speech recognition
 """
 import speech_recognition as sr
 from pydub import AudioSegment
+import asyncio
+import hashlib
 import tempfile
 import os
+import shutil
+import subprocess
+import wave
 import logging
 from typing import Dict, Any, Optional
 from fastapi import UploadFile, HTTPException
 
+from app.cache import ResponseCache
+
 logger = logging.getLogger(__name__)
 
 # Supported audio formats
-SUPPORTED_AUDIO_FORMATS = {'.wav', '.mp3', '.flac', '.m4a', '.ogg', '.aac'}
+SUPPORTED_AUDIO_FORMATS = frozenset({'.wav', '.mp3', '.flac', '.m4a', '.ogg', '.aac'})
+UNSUPPORTED_FORMAT_DETAIL = f"Unsupported file format. Supported formats: {', '.join(sorted(SUPPORTED_AUDIO_FORMATS))}"
+
+# Largest accepted upload, checked before any decoding
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+
+# Bytes read from the start of an upload to recognize its format
+AUDIO_HEADER_SIZE = 12
+
+# Chunk size used when copying uploads to disk
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Longest audio sent to Google Speech Recognition; its synchronous endpoint
+# rejects or truncates clips beyond about a minute
+MAX_AUDIO_DURATION_SECONDS = 60
+
+# Transcripts of identical uploads are reused, e.g. for batch retries and resubmissions
+TRANSCRIPT_CACHE_MAX_ENTRIES = 512
+TRANSCRIPT_CACHE_TTL = 3600.0
+
+# ffmpeg binary used to convert uploads directly; pydub is used when it is missing
+FFMPEG_PATH = shutil.which("ffmpeg")
+
+# Audio is passed to the recognizer as raw 16-bit 16kHz mono PCM
+RECOGNITION_SAMPLE_RATE = 16000
+RECOGNITION_SAMPLE_WIDTH = 2
+
+# Narrowband (telephone) WAV down to this rate is sent at its own rate rather
+# than upsampled, which would only double the bytes uploaded to Google
+MIN_RECOGNITION_SAMPLE_RATE = 8000
+
+# ffmpeg output options: headerless PCM written to stdout, decoding stops one
+# second past the duration limit so overlong uploads are not decoded in full
+FFMPEG_PCM_OUTPUT_ARGS = [
+    "-vn", "-ac", "1", "-ar", str(RECOGNITION_SAMPLE_RATE), "-f", "s16le",
+    "-t", str(MAX_AUDIO_DURATION_SECONDS + 1), "pipe:1"
+]
+
+# Formats ffmpeg can decode from a pipe; m4a needs a seekable file since its
+# index (moov atom) may come after the audio
+PIPEABLE_AUDIO_FORMATS = frozenset({'.mp3', '.flac', '.ogg', '.aac'})
+
+def _detect_audio_format(header: bytes) -> Optional[str]:
+    """Guess an audio format from the first bytes of a file, None if it matches none supported."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return '.wav'
+    if header[:4] == b"fLaC":
+        return '.flac'
+    if header[:4] == b"OggS":
+        return '.ogg'
+    if header[4:8] == b"ftyp":
+        return '.m4a'
+    if header[:3] == b"ID3":
+        return '.mp3'
+    if len(header) >= 2 and header[0] == 0xFF:
+        # ADTS (AAC) and MPEG audio frames both start with a sync word
+        if header[1] & 0xF6 == 0xF0:
+            return '.aac'
+        if header[1] & 0xE0 == 0xE0:
+            return '.mp3'
+    return None
+
+def _recognition_ready_wav_rate(wav_file) -> Optional[int]:
+    """
+    Sample rate of a WAV file that can be recognized without conversion, judged from its header only.
+    
+    Returns:
+        The rate of 16-bit mono PCM sampled at 8-16kHz, None for anything else
+    """
+    try:
+        with wave.open(wav_file, 'rb') as wav_reader:
+            sample_rate = wav_reader.getframerate()
+            if (
+                wav_reader.getnchannels() == 1
+                and wav_reader.getsampwidth() == RECOGNITION_SAMPLE_WIDTH
+                and MIN_RECOGNITION_SAMPLE_RATE <= sample_rate <= RECOGNITION_SAMPLE_RATE
+            ):
+                return sample_rate
+            return None
+    except (wave.Error, EOFError):
+        return None
+    finally:
+        wav_file.seek(0)
+
+def _read_wav_pcm(wav_file, sample_rate: int) -> bytes:
+    """Read the PCM frames of a recognition-ready WAV file, up to one second past the duration limit."""
+    with wave.open(wav_file, 'rb') as wav_reader:
+        return wav_reader.readframes((MAX_AUDIO_DURATION_SECONDS + 1) * sample_rate)
 
 class VoiceToTextConverter:
     def __init__(self):
         self.recognizer = sr.Recognizer()
+        self.transcript_cache = ResponseCache(TRANSCRIPT_CACHE_MAX_ENTRIES, TRANSCRIPT_CACHE_TTL)
     
-    def convert_to_wav(self, input_path: str, output_path: str) -> bool:
-        """Convert audio file to WAV format for speech recognition."""
+    def convert_to_pcm(self, input_path: str) -> Optional[bytes]:
+        """Convert audio file to raw PCM data for speech recognition, kept in memory."""
+        if FFMPEG_PATH:
+            # ffmpeg decodes, downmixes and resamples in one streaming pass,
+            # without loading the whole file into Python memory like pydub
+            try:
+                result = subprocess.run(
+                    [
+                        FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-i", input_path,
+                        *FFMPEG_PCM_OUTPUT_ARGS
+                    ],
+                    check=True,
+                    capture_output=True
+                )
+                return result.stdout
+            except subprocess.CalledProcessError as e:
+                logger.error("Error converting audio: %s", e.stderr.decode(errors="replace").strip())
+                return None
+            except OSError as e:
+                logger.error("Error running ffmpeg: %s", e)
+                return None
+        
         try:
             audio = AudioSegment.from_file(input_path)
             # Convert to mono and set sample rate to 16kHz for better recognition
-            audio = audio.set_channels(1).set_frame_rate(16000)
-            audio.export(output_path, format="wav")
-            return True
+            audio = audio.set_channels(1).set_frame_rate(RECOGNITION_SAMPLE_RATE)
+            return audio.set_sample_width(RECOGNITION_SAMPLE_WIDTH).raw_data
         except Exception as e:
-            logger.error(f"Error converting audio: {str(e)}")
-            return False
+            logger.error("Error converting audio: %s", e)
+            return None
+    
+    def _recognize(self, pcm_data: bytes, sample_rate: int, language: str) -> str:
+        """Run Google Speech Recognition on raw PCM audio, blocking."""
+        # The PCM is wrapped as is, without ambient noise calibration: on a file
+        # it consumes (and drops) the first second of speech
+        audio = sr.AudioData(pcm_data, sample_rate, RECOGNITION_SAMPLE_WIDTH)
+        
+        # Use Google Speech Recognition
+        return self.recognizer.recognize_google(audio, language=language)
+    
+    async def _hash_upload(self, file: UploadFile) -> bytes:
+        """Digest of an upload's content for the transcript cache, leaving the upload rewound."""
+        content_hash = hashlib.blake2b(digest_size=16)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            content_hash.update(chunk)
+        await file.seek(0)
+        return content_hash.digest()
+    
+    async def _pipe_upload_to_pcm(self, file: UploadFile) -> Optional[bytes]:
+        """
+        Feed an upload straight into ffmpeg's stdin, skipping the temp file copy.
+        
+        Returns:
+            The PCM data, or None if conversion failed
+        """
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_PATH, "-loglevel", "error", "-i", "pipe:0", *FFMPEG_PCM_OUTPUT_ARGS,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        
+        async def feed_upload():
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                try:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    # ffmpeg gave up on the input, its error is reported below
+                    break
+            process.stdin.close()
+        
+        try:
+            _, pcm_data, stderr = await asyncio.gather(
+                feed_upload(), process.stdout.read(), process.stderr.read()
+            )
+            await process.wait()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            raise
+        
+        if process.returncode != 0:
+            logger.error("Error converting audio: %s", stderr.decode(errors="replace").strip())
+            return None
+        return pcm_data
     
     async def transcribe_audio(self, file: UploadFile, language: str = "en-US") -> Dict[str, Any]:
         """
@@ -48,83 +218,138 @@ class VoiceToTextConverter:
         # Check file extension
         file_extension = os.path.splitext(file.filename)[1].lower()
         if file_extension not in SUPPORTED_AUDIO_FORMATS:
+            raise HTTPException(status_code=400, detail=UNSUPPORTED_FORMAT_DETAIL)
+        
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
             raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file format. Supported formats: {', '.join(SUPPORTED_AUDIO_FORMATS)}"
+                status_code=413,
+                detail=f"File exceeds maximum size of {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
             )
         
+        # Reject content that is no supported audio before starting ffmpeg on it;
+        # a mismatching extension is fine, the decoding path follows the real format
+        header = await file.read(AUDIO_HEADER_SIZE)
+        await file.seek(0)
+        audio_format = _detect_audio_format(header)
+        if audio_format is None:
+            raise HTTPException(status_code=400, detail="File content is not a supported audio format")
+        
+        # Set by whichever path below the upload takes: where the PCM is
+        # decoded from once the transcript cache has missed
+        input_path = wav_file = None
+        piped = False
+        temp_dir = None
+        sample_rate = RECOGNITION_SAMPLE_RATE
+        wav_rate = _recognition_ready_wav_rate(file.file) if audio_format == '.wav' else None
         try:
-            # Create temporary files
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_input:
-                # Write uploaded file to temporary file
-                content = await file.read()
-                temp_input.write(content)
-                temp_input.flush()
+            if FFMPEG_PATH and (
+                audio_format in PIPEABLE_AUDIO_FORMATS
+                or (audio_format == '.wav' and wav_rate is None)
+            ):
+                # Decode the upload through ffmpeg's stdin once the transcript
+                # cache has missed, no temporary file needed
+                cache_key = (await self._hash_upload(file), language)
+                piped = True
+            elif wav_rate is not None:
+                # 8-16kHz mono WAV needs no conversion: read it from the upload's own
+                # spooled file, which Starlette keeps in memory while it is small
+                cache_key = (await self._hash_upload(file), language)
+                wav_file = file.file
+                sample_rate = wav_rate
+            else:
+                # Create temporary file, in a directory removed as a whole afterwards
+                temp_dir = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+                input_path = os.path.join(temp_dir.name, f"upload{audio_format}")
+                with open(input_path, "wb") as temp_input:
+                    # Copy the upload to the temporary file in chunks so large
+                    # files are never held in memory as a whole, hashing it on the way
+                    content_hash = hashlib.blake2b(digest_size=16)
+                    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                        temp_input.write(chunk)
+                        content_hash.update(chunk)
                 
-                # Convert to WAV if necessary
-                if file_extension != '.wav':
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_wav:
-                        if not self.convert_to_wav(temp_input.name, temp_wav.name):
-                            raise HTTPException(status_code=500, detail="Failed to convert audio file")
-                        audio_file_path = temp_wav.name
-                else:
-                    audio_file_path = temp_input.name
+                cache_key = (content_hash.digest(), language)
+            
+            cached_result = self.transcript_cache.get(cache_key)
+            if cached_result is not None:
+                logger.info("Reusing cached transcription for audio file: %s", file.filename)
+                return {
+                    "success": True,
+                    "filename": file.filename,
+                    "text": cached_result["text"],
+                    "language": language,
+                    "type": "voice_to_text"
+                }
+            
+            # Decode to PCM, in memory rather than through a second temp file
+            if piped:
+                pcm_data = await self._pipe_upload_to_pcm(file)
+            elif input_path is not None:
+                pcm_data = await asyncio.to_thread(self.convert_to_pcm, input_path)
+            else:
+                pcm_data = await asyncio.to_thread(_read_wav_pcm, wav_file, sample_rate)
+            if pcm_data is None:
+                raise HTTPException(status_code=500, detail="Failed to convert audio file")
+            
+            # Decoding stops one second past the limit, enough to tell it was exceeded
+            if len(pcm_data) > MAX_AUDIO_DURATION_SECONDS * sample_rate * RECOGNITION_SAMPLE_WIDTH:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Audio exceeds maximum duration of {MAX_AUDIO_DURATION_SECONDS} seconds"
+                )
+            
+            # Perform speech recognition in a worker thread, it blocks for
+            # the whole round trip to Google
+            try:
+                text = await asyncio.to_thread(self._recognize, pcm_data, sample_rate, language)
+                self.transcript_cache.put(cache_key, {"text": text})
+                logger.info("Successfully transcribed audio file: %s", file.filename)
+                return {
+                    "success": True,
+                    "filename": file.filename,
+                    "text": text,
+                    "language": language,
+                    "type": "voice_to_text"
+                }
+                
+            except sr.UnknownValueError:
+                logger.warning("Could not understand audio in file: %s", file.filename)
+                raise HTTPException(
+                    status_code=400, 
+                    detail="Could not understand the audio. Please ensure the audio is clear and contains speech."
+                )
                 
-                # Perform speech recognition
-                with sr.AudioFile(audio_file_path) as source:
-                    # Adjust for ambient noise
-                    self.recognizer.adjust_for_ambient_noise(source)
-                    audio = self.recognizer.record(source)
-                    
-                    try:
-                        # Use Google Speech Recognition
-                        text = self.recognizer.recognize_google(audio, language=language)
-                        logger.info(f"Successfully transcribed audio file: {file.filename}")
-                        return {
-                            "success": True,
-                            "filename": file.filename,
-                            "text": text,
-                            "language": language,
-                            "type": "voice_to_text"
-                        }
-                        
-                    except sr.UnknownValueError:
-                        logger.warning(f"Could not understand audio in file: {file.filename}")
-                        raise HTTPException(
-                            status_code=400, 
-                            detail="Could not understand the audio. Please ensure the audio is clear and contains speech."
-                        )
-                        
-                    except sr.RequestError as e:
-                        logger.error(f"Speech recognition service error: {str(e)}")
-                        raise HTTPException(
-                            status_code=503, 
-                            detail=f"Speech recognition service unavailable: {str(e)}"
-                        )
+            except sr.RequestError as e:
+                logger.error("Speech recognition service error: %s", e)
+                raise HTTPException(
+                    status_code=503, 
+                    detail=f"Speech recognition service unavailable: {str(e)}"
+                )
         
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Unexpected error processing file {file.filename}: {str(e)}")
+            logger.error("Unexpected error processing file %s: %s", file.filename, e)
             raise HTTPException(status_code=500, detail="Internal server error occurred")
         
         finally:
-            # Clean up temporary files
-            try:
-                if 'temp_input' in locals():
-                    os.unlink(temp_input.name)
-                if 'temp_wav' in locals() and file_extension != '.wav':
-                    os.unlink(temp_wav.name)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary files: {str(e)}")
+            # Clean up temporary file
+            if temp_dir is not None:
+                temp_dir.cleanup()
     
-    async def transcribe_batch(self, files: list[UploadFile], language: str = "en-US") -> Dict[str, Any]:
+    async def transcribe_batch(
+        self,
+        files: list[UploadFile],
+        language: str = "en-US",
+        concurrent_limit: int = 3
+    ) -> Dict[str, Any]:
         """
         Transcribe multiple audio files to text.
         
         Args:
             files: List of uploaded audio files
             language: Language code for recognition
+            concurrent_limit: Maximum number of files transcribed at once
             
         Returns:
             Dictionary containing batch transcription results
@@ -135,29 +360,30 @@ class VoiceToTextConverter:
         if len(files) > 10:
             raise HTTPException(status_code=400, detail="Maximum 10 files allowed per batch")
         
-        results = []
+        semaphore = asyncio.Semaphore(max(1, concurrent_limit))
         
-        for file in files:
-            try:
-                # Process each file individually
-                result = await self.transcribe_audio(file, language)
-                results.append(result)
-            except HTTPException as e:
-                results.append({
-                    "success": False,
-                    "filename": file.filename,
-                    "error": e.detail,
-                    "type": "voice_to_text"
-                })
-            except Exception as e:
-                results.append({
-                    "success": False,
-                    "filename": file.filename,
-                    "error": "Unexpected error occurred",
-                    "type": "voice_to_text"
-                })
+        async def transcribe_single(file: UploadFile) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self.transcribe_audio(file, language)
+                except HTTPException as e:
+                    return {
+                        "success": False,
+                        "filename": file.filename,
+                        "error": e.detail,
+                        "type": "voice_to_text"
+                    }
+                except Exception as e:
+                    return {
+                        "success": False,
+                        "filename": file.filename,
+                        "error": "Unexpected error occurred",
+                        "type": "voice_to_text"
+                    }
+        
+        results = await asyncio.gather(*[transcribe_single(file) for file in files])
         
-        return {"results": results, "type": "voice_to_text_batch"}
+        return {"results": list(results), "type": "voice_to_text_batch"}
 
 # Global instance
 voice_to_text_converter = VoiceToTextConverter()
@@ -0,0 +1,74 @@
+"""
+Tests for idempotent retries of text input forwarding
+"""
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+
+from app.forwarding import ForwardingService
+
+TARGET_URL = "http://agent.test/chat"
+
+
+class IdempotencyKeyTest(unittest.IsolatedAsyncioTestCase):
+    """Forward results are reused only for retries of the same request"""
+    
+    async def asyncSetUp(self):
+        self.rest_api_client = mock.Mock()
+        self.rest_api_client.forward_text_input_result = mock.AsyncMock(
+            side_effect=lambda text, *args: {"success": True, "response_data": {"echo": text}}
+        )
+        self.service = ForwardingService(None, None, self.rest_api_client)
+    
+    async def forward(self, text="yes", session_id="session-1", user_id="user-1", idempotency_key="key-1"):
+        return await self.service.forward_text_input(
+            text, TARGET_URL, session_id=session_id, user_id=user_id, idempotency_key=idempotency_key
+        )
+    
+    async def test_retry_gets_original_result(self):
+        first = await self.forward()
+        retry = await self.forward()
+        
+        self.assertEqual(self.rest_api_client.forward_text_input_result.await_count, 1)
+        self.assertFalse(first["cached"])
+        self.assertTrue(retry["cached"])
+        self.assertEqual(retry["forward_result"], first["forward_result"])
+    
+    async def test_repeated_message_without_key_is_forwarded(self):
+        await self.forward(idempotency_key=None)
+        second = await self.forward(idempotency_key=None)
+        
+        self.assertEqual(self.rest_api_client.forward_text_input_result.await_count, 2)
+        self.assertFalse(second["cached"])
+    
+    async def test_key_is_scoped_to_session_and_user(self):
+        await self.forward()
+        other_session = await self.forward(session_id="session-2")
+        other_user = await self.forward(user_id="user-2")
+        
+        self.assertEqual(self.rest_api_client.forward_text_input_result.await_count, 3)
+        self.assertFalse(other_session["cached"])
+        self.assertFalse(other_user["cached"])
+    
+    async def test_key_reused_for_different_text_is_rejected(self):
+        await self.forward(text="yes")
+        
+        for text in ("Yes", "yes ", "no"):
+            with self.subTest(text=text), self.assertRaises(HTTPException) as raised:
+                await self.forward(text=text)
+            self.assertEqual(raised.exception.status_code, 422)
+        self.assertEqual(self.rest_api_client.forward_text_input_result.await_count, 1)
+    
+    async def test_failed_forward_is_not_reused(self):
+        self.rest_api_client.forward_text_input_result.side_effect = None
+        self.rest_api_client.forward_text_input_result.return_value = {"success": False, "error": "HTTP 502"}
+        await self.forward()
+        retry = await self.forward()
+        
+        self.assertEqual(self.rest_api_client.forward_text_input_result.await_count, 2)
+        self.assertFalse(retry["cached"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Tests for the voice-to-voice workflow endpoint
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from urllib.parse import unquote
+
+from app import main
+
+SESSION_ID = "セッション-1"
+AGENT_REPLY = "Sure — “tomorrow” works 👍\n明日"
+
+
+async def fake_stream(*args):
+    yield b"audio"
+
+
+class VoiceToVoiceHeadersTest(unittest.IsolatedAsyncioTestCase):
+    """Workflow headers carry text in any language"""
+    
+    async def asyncSetUp(self):
+        transcription = {"success": True, "text": "¿Mañana?"}
+        forward_result = {"success": True, "response_data": {"response": {"agent_response": AGENT_REPLY}}}
+        patches = [
+            mock.patch.object(main.voice_to_text_converter, "transcribe_audio", mock.AsyncMock(return_value=transcription)),
+            mock.patch.object(main.rest_api_client, "forward_transcription_result", mock.AsyncMock(return_value=forward_result)),
+            mock.patch.object(main.text_to_voice_converter, "schedule_warmup"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    async def call_workflow(self, if_none_match=None):
+        return await main.voice_to_voice_workflow(
+            file=mock.Mock(),
+            session_id=SESSION_ID,
+            user_id="ユーザー",
+            channel="voice",
+            language="es-ES",
+            voice_language="en",
+            slow=False,
+            if_none_match=if_none_match
+        )
+    
+    def assert_text_headers(self, response):
+        self.assertEqual(unquote(response.headers["x-session-id"]), SESSION_ID)
+        self.assertEqual(unquote(response.headers["x-user-id"]), "ユーザー")
+        self.assertEqual(unquote(response.headers["x-original-text"]), "¿Mañana?")
+        self.assertEqual(unquote(response.headers["x-response-text"]), AGENT_REPLY)
+        self.assertIn("filename*=utf-8''", response.headers["content-disposition"])
+    
+    async def test_streamed_reply_with_non_ascii_text(self):
+        with mock.patch.object(main.text_to_voice_converter, "get_cached_speech", return_value=None), \
+                mock.patch.object(main.text_to_voice_converter, "stream_speech", mock.AsyncMock(return_value=fake_stream())):
+            response = await self.call_workflow()
+        
+        self.assert_text_headers(response)
+    
+    async def call_cached_workflow(self, if_none_match=None):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            audio_path = os.path.join(cache_dir, "cached.mp3")
+            with open(audio_path, "wb") as audio_file:
+                audio_file.write(b"audio")
+            cached_speech = ("cachekey", audio_path, os.stat(audio_path))
+            with mock.patch.object(main.text_to_voice_converter, "get_cached_speech", return_value=cached_speech):
+                return await self.call_workflow(if_none_match)
+    
+    async def test_cached_reply_with_non_ascii_text(self):
+        response = await self.call_cached_workflow()
+        
+        self.assert_text_headers(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["etag"], '"cachekey"')
+    
+    async def test_matching_if_none_match_is_not_modified(self):
+        response = await self.call_cached_workflow(if_none_match='"other", "cachekey"')
+        
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(response.headers["etag"], '"cachekey"')
+        self.assertEqual(unquote(response.headers["x-response-text"]), AGENT_REPLY)
+    
+    async def test_stale_if_none_match_gets_audio(self):
+        response = await self.call_cached_workflow(if_none_match='"other"')
+        
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
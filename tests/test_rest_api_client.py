@@ -0,0 +1,152 @@
+"""
+Tests for forwarding requests sent by the REST API client
+"""
+import base64
+import os
+import tempfile
+import unittest
+
+import orjson
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.rest_api_client import RestApiClient
+
+ITEMS = [{"text": "one"}, {"text": "two"}, {"text": "three"}]
+AUDIO = b"ID3-mp3-audio"
+
+
+class TargetServerTest(unittest.IsolatedAsyncioTestCase):
+    """Runs a local target API recording the requests it receives"""
+    
+    async def asyncSetUp(self):
+        self.requests = []
+        self.batch_status = 200
+        app = web.Application()
+        app.router.add_post("/chat", self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.url = str(self.server.make_url("/chat"))
+        self.client = RestApiClient()
+    
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+    
+    async def handle(self, request):
+        self.requests.append(request)
+        body = await request.read()
+        payload = orjson.loads(body)
+        if "items" in payload:
+            if self.batch_status != 200:
+                return web.Response(status=self.batch_status)
+            return web.json_response({"results": [{"echo": item["text"]} for item in payload["items"]]})
+        return web.json_response({"echo": payload["text"]})
+
+
+class BatchEnvelopeTest(TargetServerTest):
+    """Batches go out as one request to batch-capable targets"""
+    
+    async def test_batch_sent_in_one_request(self):
+        self.client.register_batch_endpoint(self.url)
+        
+        results = await self.client.send_batch_transcriptions(self.url, ITEMS)
+        
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual([result["response_data"] for result in results], [{"echo": "one"}, {"echo": "two"}, {"echo": "three"}])
+        self.assertIn(self.url, self.client.batch_urls)
+    
+    async def test_unsupported_batch_falls_back_to_single_requests(self):
+        for status in (404, 405, 415):
+            with self.subTest(status=status):
+                self.requests.clear()
+                self.batch_status = status
+                self.client.register_batch_endpoint(self.url)
+                
+                results = await self.client.send_batch_transcriptions(self.url, ITEMS)
+                
+                # The rejected batch, then one request per item
+                self.assertEqual(len(self.requests), 4)
+                self.assertEqual([result["index"] for result in results], [0, 1, 2])
+                self.assertEqual([result["response_data"] for result in results], [{"echo": "one"}, {"echo": "two"}, {"echo": "three"}])
+                self.assertNotIn(self.url, self.client.batch_urls)
+    
+    async def test_failed_batch_is_not_resent(self):
+        self.batch_status = 500
+        self.client.register_batch_endpoint(self.url)
+        
+        results = await self.client.send_batch_transcriptions(self.url, ITEMS)
+        
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.assertFalse(any(result["success"] for result in results))
+    
+    async def test_unregistered_target_gets_single_requests(self):
+        results = await self.client.send_batch_transcriptions(self.url, ITEMS)
+        
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+
+
+
+class AudioForwardingTest(TargetServerTest):
+    """Text-to-voice audio goes out as multipart or as base64 in JSON"""
+    
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.audio_dir = tempfile.TemporaryDirectory()
+        self.audio_path = os.path.join(self.audio_dir.name, "speech_key.mp3")
+        with open(self.audio_path, "wb") as audio_file:
+            audio_file.write(AUDIO)
+        self.tts_result = {"success": True, "file_path": self.audio_path, "language": "en"}
+    
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.audio_dir.cleanup()
+    
+    async def handle(self, request):
+        self.requests.append(request)
+        if request.content_type == "multipart/form-data":
+            self.parts = {}
+            reader = await request.multipart()
+            while (part := await reader.next()) is not None:
+                self.parts[part.name] = (part.filename, part.headers.get("Content-Type"), await part.read())
+        else:
+            self.payload = orjson.loads(await request.read())
+        return web.json_response({"ok": True})
+    
+    async def test_multipart_has_metadata_and_audio_parts(self):
+        self.client.register_multipart_audio_endpoint(self.url)
+        
+        result = await self.client.forward_text_to_voice_result(self.tts_result, self.url, include_audio_data=True)
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(set(self.parts), {"metadata", "audio"})
+        _, metadata_type, metadata = self.parts["metadata"]
+        self.assertEqual(metadata_type, "application/json")
+        self.assertEqual(orjson.loads(metadata)["text_to_voice"], self.tts_result)
+        self.assertNotIn("audio_data", orjson.loads(metadata))
+        self.assertEqual(self.parts["audio"], ("speech_key.mp3", "audio/mpeg", AUDIO))
+    
+    async def test_unregistered_target_gets_base64_audio(self):
+        result = await self.client.forward_text_to_voice_result(self.tts_result, self.url, include_audio_data=True)
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(self.payload["audio_data"]["encoding"], "base64")
+        self.assertEqual(base64.b64decode(self.payload["audio_data"]["data"]), AUDIO)
+    
+    async def test_missing_audio_file_is_forwarded_without_audio(self):
+        self.client.register_multipart_audio_endpoint(self.url)
+        self.tts_result["file_path"] = os.path.join(self.audio_dir.name, "missing.mp3")
+        
+        result = await self.client.forward_text_to_voice_result(self.tts_result, self.url, include_audio_data=True)
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(len(self.requests), 1)
+        self.assertNotIn("audio_data", self.payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
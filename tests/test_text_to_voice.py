@@ -0,0 +1,283 @@
+"""
+Tests for synthesis and request coalescing in the text-to-voice converter
+"""
+import asyncio
+import base64
+import tempfile
+import unittest
+from unittest import mock
+
+from gtts import gTTS, gTTSError
+
+from app import text_to_voice
+from app.cache import AudioCache
+from app.text_to_voice import TextToVoiceConverter
+
+PARTS = [b"part-1", b"part-2", b"part-3"]
+
+# Three sentences gTTS sends as three separate requests
+LONG_TEXT = (
+    "The first sentence is long enough to be synthesized as a part of its own. "
+    "The second sentence also fills a part of about eighty characters by itself. "
+    "And the third sentence closes the text with one more part of similar length."
+)
+
+
+def batchexecute_body(audio: bytes) -> bytes:
+    """A gTTS batchexecute response carrying audio"""
+    encoded = base64.b64encode(audio).decode()
+    return b")]}'\n\n" + f'[["wrb.fr","jQ1olc","[\\"{encoded}\\"]",null,null,null,"generic"]]\n'.encode()
+
+
+class FakeResponse:
+    """Response of FakeSession, usable as an async context manager"""
+    
+    def __init__(self, status: int, body: bytes, delay: float):
+        self.status = status
+        self.body = body
+        self.delay = delay
+    
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return False
+    
+    async def read(self) -> bytes:
+        return self.body
+
+
+class FakeSession:
+    """
+    Stands in for the aiohttp session gTTS requests are sent over
+    
+    Part i of the text is answered with the audio b"audio-i", later parts
+    faster than earlier ones so completion order differs from text order.
+    """
+    
+    closed = False
+    
+    def __init__(self, text: str):
+        self.bodies = [request.body for request in gTTS(text=text, lang="en", lang_check=False)._prepare_requests()]
+        self.responses = {}
+        self.posted = []
+    
+    async def close(self):
+        pass
+    
+    def post(self, url, data=None, headers=None):
+        self.posted.append((url, data, headers))
+        index = self.bodies.index(data)
+        status, body = self.responses.get(index, (200, batchexecute_body(f"audio-{index}".encode())))
+        return FakeResponse(status, body, 0.01 * (len(self.bodies) - index))
+
+
+class CoalescingTest(unittest.IsolatedAsyncioTestCase):
+    """Concurrent requests for identical audio share one gTTS synthesis"""
+    
+    async def asyncSetUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.converter = TextToVoiceConverter()
+        self.converter.cache = AudioCache(self.cache_dir.name, 10 * 1024 * 1024)
+        self.synthesis_calls = 0
+        self.fail = False
+        
+        async def fake_synthesize_parts(text, language, slow):
+            self.synthesis_calls += 1
+            for part in PARTS:
+                await asyncio.sleep(0.01)
+                if self.fail:
+                    raise RuntimeError("gTTS unavailable")
+                yield part
+        
+        self.converter._synthesize_parts = fake_synthesize_parts
+    
+    async def asyncTearDown(self):
+        await self.converter.close()
+        self.cache_dir.cleanup()
+    
+    async def read_stream(self, text="hello"):
+        stream = await self.converter.stream_speech(text)
+        return b"".join([chunk async for chunk in stream])
+    
+    async def test_concurrent_streams_synthesize_once(self):
+        results = await asyncio.gather(self.read_stream(), self.read_stream())
+        
+        self.assertEqual(self.synthesis_calls, 1)
+        self.assertEqual(results, [b"".join(PARTS)] * 2)
+    
+    async def test_stream_and_info_synthesize_once(self):
+        stream_audio, info = await asyncio.gather(
+            self.read_stream(),
+            self.converter.convert_to_speech_info("hello")
+        )
+        
+        self.assertEqual(self.synthesis_calls, 1)
+        self.assertEqual(stream_audio, b"".join(PARTS))
+        self.assertEqual(info["file_size_bytes"], len(b"".join(PARTS)))
+    
+    async def test_download_and_batch_synthesize_once(self):
+        response, batch = await asyncio.gather(
+            self.converter.convert_to_speech("hello"),
+            self.converter.convert_batch_to_speech(["hello", "hello"])
+        )
+        streamed_audio = b"".join([chunk async for chunk in response.body_iterator])
+        
+        self.assertEqual(self.synthesis_calls, 1)
+        self.assertEqual(streamed_audio, b"".join(PARTS))
+        self.assertEqual(batch["successful_conversions"], 2)
+    
+    async def test_late_joiner_gets_whole_audio(self):
+        stream = await self.converter.stream_speech("hello")
+        first_chunk = await anext(stream)
+        # The first stream has consumed part of the audio before the second joins
+        joined_audio = await self.read_stream()
+        rest = b"".join([chunk async for chunk in stream])
+        
+        self.assertEqual(self.synthesis_calls, 1)
+        self.assertEqual(first_chunk + rest, b"".join(PARTS))
+        self.assertEqual(joined_audio, b"".join(PARTS))
+    
+    async def test_abandoned_stream_still_caches(self):
+        stream = await self.converter.stream_speech("hello")
+        await stream.aclose()
+        await asyncio.gather(*self.converter._synthesis_tasks)
+        
+        self.assertIsNotNone(self.converter.cache.get(self.converter.cache.make_key("hello", "en", False)))
+        self.assertEqual(await self.read_stream(), b"".join(PARTS))
+        self.assertEqual(self.synthesis_calls, 1)
+    
+    async def test_failure_is_shared_and_not_kept(self):
+        self.fail = True
+        results = await asyncio.gather(
+            self.read_stream(),
+            self.converter.convert_to_speech_info("hello"),
+            return_exceptions=True
+        )
+        
+        self.assertEqual(self.synthesis_calls, 1)
+        self.assertTrue(all(isinstance(result, Exception) for result in results))
+        
+        # A later request starts a fresh synthesis
+        self.fail = False
+        self.assertEqual(await self.read_stream(), b"".join(PARTS))
+        self.assertEqual(self.synthesis_calls, 2)
+
+
+class SynthesisTest(unittest.IsolatedAsyncioTestCase):
+    """gTTS requests are sent over aiohttp and their audio decoded"""
+    
+    async def asyncSetUp(self):
+        self.converter = TextToVoiceConverter()
+        self.session = FakeSession(LONG_TEXT)
+        self.converter.session = self.session
+    
+    async def synthesize(self, text=LONG_TEXT):
+        return [part async for part in self.converter._synthesize_parts(text, "en", False)]
+    
+    async def test_parts_decoded_in_text_order(self):
+        parts = await self.synthesize()
+        
+        self.assertEqual(len(self.session.bodies), 3)
+        self.assertEqual(parts, [b"audio-0", b"audio-1", b"audio-2"])
+        url, _, headers = self.session.posted[0]
+        self.assertIn("batchexecute", url)
+        self.assertNotIn("Content-Length", headers)
+    
+    async def test_http_error_raises(self):
+        self.session.responses[0] = (500, b"")
+        
+        with self.assertRaisesRegex(gTTSError, "HTTP 500"):
+            await self.synthesize()
+    
+    async def test_response_without_audio_raises(self):
+        self.session.responses[0] = (200, b")]}'\n\n[[\"wrb.fr\",\"jQ1olc\",null]]\n")
+        
+        with self.assertRaisesRegex(gTTSError, "No audio stream"):
+            await self.synthesize()
+    
+    async def test_failed_part_fails_whole_text(self):
+        # Part 2 of 3 fails while part 1 is still pending
+        self.session.responses[1] = (503, b"")
+        parts = []
+        
+        with self.assertRaisesRegex(gTTSError, "HTTP 503"):
+            async for part in self.converter._synthesize_parts(LONG_TEXT, "en", False):
+                parts.append(part)
+        
+        self.assertEqual(parts, [])
+    
+    async def test_failed_part_is_not_cached_or_shared(self):
+        self.session.responses[1] = (503, b"")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.converter.cache = AudioCache(cache_dir, 10 * 1024 * 1024)
+            
+            results = await asyncio.gather(
+                self.converter.stream_speech(LONG_TEXT),
+                self.converter.convert_to_speech_info(LONG_TEXT),
+                return_exceptions=True
+            )
+            
+            self.assertTrue(all(isinstance(result, Exception) for result in results))
+            self.assertEqual(len(self.session.posted), 3)
+            self.assertIsNone(self.converter.cache.get(self.converter.cache.make_key(LONG_TEXT, "en", False)))
+    
+    async def test_blocking_client_fallback(self):
+        def fake_stream(tts):
+            yield from PARTS
+        
+        with mock.patch.object(text_to_voice, "GTTS_ASYNC_SUPPORTED", False), \
+                mock.patch.object(gTTS, "stream", fake_stream):
+            parts = await self.synthesize()
+        
+        self.assertEqual(parts, PARTS)
+        self.assertEqual(self.session.posted, [])
+    
+    def test_pinned_gtts_exposes_prepared_requests(self):
+        # The pinned gTTS version must keep the private API the async path relies on
+        self.assertTrue(text_to_voice.GTTS_ASYNC_SUPPORTED)
+
+
+class CachedFileResponseTest(unittest.IsolatedAsyncioTestCase):
+    """Cached speech is sent from Python or by the reverse proxy with the same headers"""
+    
+    async def asyncSetUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.converter = TextToVoiceConverter()
+        self.converter.cache = AudioCache(self.cache_dir.name, 10 * 1024 * 1024)
+        self.converter.cache.store(self.converter.cache.make_key("hello", "en", False), b"".join(PARTS))
+    
+    async def asyncTearDown(self):
+        await self.converter.close()
+        self.cache_dir.cleanup()
+    
+    async def download(self, accel_prefix=None):
+        with mock.patch.object(text_to_voice, "TTS_CACHE_ACCEL_PREFIX", accel_prefix):
+            return await self.converter.convert_to_speech("hello")
+    
+    async def test_accel_branch_matches_file_response_headers(self):
+        file_response = await self.download()
+        accel_response = await self.download("/tts-cache/")
+        
+        key = self.converter.cache.make_key("hello", "en", False)
+        self.assertEqual(accel_response.headers["x-accel-redirect"], f"/tts-cache/{key}.mp3")
+        self.assertEqual(accel_response.body, b"")
+        for name in ("content-type", "etag", "cache-control", "content-disposition", "last-modified"):
+            self.assertEqual(accel_response.headers[name], file_response.headers[name], name)
+        self.assertEqual(accel_response.headers["etag"], f'"{key}"')
+        self.assertEqual(accel_response.headers["content-type"], "audio/mpeg")
+        self.assertEqual(len(accel_response.headers.getlist("etag")), 1)
+    
+    async def test_matching_if_none_match_is_not_modified(self):
+        etag = f'"{self.converter.cache.make_key("hello", "en", False)}"'
+        response = await self.converter.convert_to_speech("hello", if_none_match=f"W/{etag}")
+        
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertNotIn("content-length", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
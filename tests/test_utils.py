@@ -0,0 +1,79 @@
+"""
+Tests for shared utility functions
+"""
+import os
+import unittest
+from unittest import mock
+
+from app.utils import env_flag, env_list, etag_matches, extract_agent_response
+
+
+class EnvFlagTest(unittest.TestCase):
+    """On/off settings read from the environment"""
+    
+    def test_true_values(self):
+        for value in ("1", "true", "TRUE", " yes ", "on"):
+            with self.subTest(value=value), mock.patch.dict(os.environ, {"FLAG": value}):
+                self.assertTrue(env_flag("FLAG"))
+    
+    def test_false_values(self):
+        for value in ("0", "false", "no", ""):
+            with self.subTest(value=value), mock.patch.dict(os.environ, {"FLAG": value}):
+                self.assertFalse(env_flag("FLAG", default=True))
+    
+    def test_unset_uses_default(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertFalse(env_flag("FLAG"))
+            self.assertTrue(env_flag("FLAG", default=True))
+
+
+class EnvListTest(unittest.TestCase):
+    """List settings read from the environment"""
+    
+    def test_items_split_and_stripped(self):
+        with mock.patch.dict(os.environ, {"PHRASES": "Hello, how can I help? | One moment||Goodbye "}):
+            self.assertEqual(env_list("PHRASES"), ["Hello, how can I help?", "One moment", "Goodbye"])
+    
+    def test_unset_is_empty(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(env_list("PHRASES"), [])
+
+
+
+class EtagMatchesTest(unittest.TestCase):
+    """If-None-Match comparison against a response ETag"""
+    
+    def test_matches(self):
+        for header in ('"abc"', 'W/"abc"', '"x", "abc"', "*"):
+            with self.subTest(header=header):
+                self.assertTrue(etag_matches(header, '"abc"'))
+    
+    def test_does_not_match(self):
+        for header in (None, "", '"x"', "abc"):
+            with self.subTest(header=header):
+                self.assertFalse(etag_matches(header, '"abc"'))
+
+
+
+class ExtractAgentResponseTest(unittest.TestCase):
+    """Agent reply taken from the external API response"""
+    
+    def test_reply(self):
+        self.assertEqual(extract_agent_response({"response": {"agent_response": "Hi there"}}), "Hi there")
+    
+    def test_null_reply_is_empty(self):
+        self.assertEqual(extract_agent_response({"response": {"agent_response": None}}), "")
+    
+    def test_missing_key_is_invalid(self):
+        for response_data in ({}, {"response": {}}, {"response": {"text": "Hi"}}):
+            with self.subTest(response_data=response_data):
+                self.assertIsNone(extract_agent_response(response_data))
+    
+    def test_non_dict_is_invalid(self):
+        for response_data in (None, "Hi", ["Hi"], {"response": "Hi"}, {"response": ["Hi"]}):
+            with self.subTest(response_data=response_data):
+                self.assertIsNone(extract_agent_response(response_data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for upload handling in the voice-to-text converter
+"""
+import io
+import unittest
+from unittest import mock
+
+from fastapi import UploadFile
+
+from app import voice_to_text
+from app.voice_to_text import VoiceToTextConverter
+
+M4A_HEADER = b"\x00\x00\x00\x20ftypM4A \x00\x00\x00\x00"
+MP3_HEADER = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+PCM_DATA = b"\x00\x00" * 1600
+
+
+def make_upload(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(io.BytesIO(content), size=len(content), filename=filename)
+
+
+class DecodingPathTest(unittest.IsolatedAsyncioTestCase):
+    """The decoding path follows the detected container, not the file name"""
+    
+    async def asyncSetUp(self):
+        self.converter = VoiceToTextConverter()
+        self.converter._pipe_upload_to_pcm = mock.AsyncMock(return_value=PCM_DATA)
+        self.converter.convert_to_pcm = mock.Mock(return_value=PCM_DATA)
+        self.converter._recognize = mock.Mock(return_value="hello")
+        patcher = mock.patch.object(voice_to_text, "FFMPEG_PATH", "/usr/bin/ffmpeg")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    async def test_mislabelled_m4a_is_decoded_from_a_file(self):
+        upload = make_upload(M4A_HEADER + b"\x00" * 64, "clip.mp3")
+        
+        result = await self.converter.transcribe_audio(upload)
+        
+        self.assertEqual(result["text"], "hello")
+        self.converter._pipe_upload_to_pcm.assert_not_called()
+        input_path = self.converter.convert_to_pcm.call_args.args[0]
+        self.assertTrue(input_path.endswith(".m4a"))
+    
+    async def test_mislabelled_mp3_is_piped(self):
+        upload = make_upload(MP3_HEADER + b"\x00" * 64, "clip.m4a")
+        
+        result = await self.converter.transcribe_audio(upload)
+        
+        self.assertEqual(result["text"], "hello")
+        self.converter._pipe_upload_to_pcm.assert_awaited_once()
+        self.converter.convert_to_pcm.assert_not_called()
+    
+    
+    async def test_repeated_upload_is_not_decoded_again(self):
+        content = MP3_HEADER + b"\x01" * 64
+        
+        first = await self.converter.transcribe_audio(make_upload(content, "clip.mp3"))
+        second = await self.converter.transcribe_audio(make_upload(content, "clip.mp3"))
+        
+        self.assertEqual(first["text"], second["text"])
+        self.converter._pipe_upload_to_pcm.assert_awaited_once()
+        self.converter._recognize.assert_called_once()
+    
+    async def test_piped_upload_is_rewound_after_hashing(self):
+        content = MP3_HEADER + b"\x02" * 64
+        
+        async def read_upload(file):
+            return PCM_DATA if await file.read() == content else None
+        
+        self.converter._pipe_upload_to_pcm = read_upload
+        result = await self.converter.transcribe_audio(make_upload(content, "clip.mp3"))
+        
+        self.assertEqual(result["text"], "hello")
+
+
+if __name__ == "__main__":
+    unittest.main()